@@ -1,32 +1,56 @@
-from fastapi import APIRouter, Request, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, Request, Response, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.schemas.bot import BotInfoResponse, BotInfoCreate, BotInfoUpdate, BotInfoListResponse
 from app.services.bot_info import BotInfoService
 from app.core.auth import require_admin_auth
+from app.core.cache import cached_response
+from app.core.config import settings
 from app.database.mongodb import get_database
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 router = APIRouter(
     prefix="/bot",
     tags=["bot"]
 )
 
 @router.get("", response_model=List[BotInfoListResponse])
-async def list_bots(db: AsyncIOMotorDatabase = Depends(get_database)):
+async def list_bots(
+    request: Request,
+    after: Optional[str] = Query(None, description="Return bots created after this bot ID"),
+    headline_prefix: Optional[str] = Query(None, description="Return bots whose headline starts with this text"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.BOT_LIST_PAGE_MAX),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
     service = BotInfoService(db)
-    return await service.list_bots()
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            await service.stream_bots(after, headline_prefix, limit),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+
+    page = await service.list_bots_page(after, headline_prefix, limit)
+    headers = {}
+    if page.next_after:
+        next_url = request.url.include_query_params(after=page.next_after)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+    return cached_response(request, page.body, headers)
 
 @router.get("/{bot_id}", response_model=BotInfoResponse)
 @require_admin_auth
 async def get_bot_info(
     bot_id: str, 
     request: Request,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     try:
         service = BotInfoService(db)
-        return await service.get_bot_info(bot_id)
+        # A returned Response replaces `response`, so carry its headers (admin token) over
+        return cached_response(request, await service.get_bot_info_body(bot_id), response.headers)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -47,6 +71,7 @@ async def update_bot_info(
     bot_id: str, 
     bot_data: BotInfoUpdate, 
     request: Request,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     service = BotInfoService(db)
@@ -57,6 +82,7 @@ async def update_bot_info(
 async def delete_bot_info(
     bot_id: str,
     request: Request,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     service = BotInfoService(db)
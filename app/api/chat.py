@@ -1,37 +1,144 @@
-from fastapi import APIRouter, Request, Depends
+from typing import Dict, Optional, Union
+from fastapi import APIRouter, Request, Depends, Header, HTTPException, Query
 from sse_starlette.sse import EventSourceResponse
-import json
 import asyncio
+import itertools
+import json
+import math
+import time
+import uuid
 
+from app.core.admission import AdmissionRejected, admission
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
 from app.database.mongodb import get_database
+from app.core.llm import LLMClient, get_llm_client
 from app.crud.chat import ChatCRUD
 from app.services.chat import ChatService
+from app.services.generations import Generation, generations, parse_event_id
+from app.services.streaming import StreamEncoder, StreamInterrupted, close_on, negotiate_stream_mode, pace_deltas
 from app.schemas.chat import (
     MessageCreate, 
     MessageResponse, 
+    StreamMode,
     StreamResponse, 
     CompletionResponse,
     ChatHistory,
     HistoryMessage,
-    MessageEdit
+    MessageEdit,
+    PacingPolicy
 )
 
 router = APIRouter(prefix="/chat")
 
+SSE_TIME_TO_FIRST_TOKEN = Histogram(
+    "chat_sse_time_to_first_token_seconds",
+    "Time from accepting a chat request to sending the first assistant frame"
+)
+SSE_STREAM_DURATION = Histogram(
+    "chat_sse_stream_duration_seconds",
+    "Total time spent streaming a chat reply",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+)
+
+SSE_RESUMES = Counter(
+    "chat_sse_resumes_total",
+    "Reconnects with Last-Event-ID, by whether the chat turn could be resumed",
+    ["result"]
+)
+
+# Start time of every open stream; the gauges below are computed from it when scraped
+_open_streams: Dict[int, float] = {}
+_stream_ids = itertools.count()
+
+def _oldest_stream_age() -> Dict[tuple, float]:
+    now = time.perf_counter()
+    return {(): now - min(_open_streams.values()) if _open_streams else 0.0}
+
+SSE_OPEN_STREAMS = Gauge(
+    "chat_sse_open_streams",
+    "SSE chat streams currently open",
+    function=lambda: {(): len(_open_streams)}
+)
+SSE_OLDEST_STREAM_AGE = Gauge(
+    "chat_sse_oldest_stream_age_seconds",
+    "Age of the longest-running open SSE chat stream",
+    function=_oldest_stream_age
+)
+
+async def watch_disconnect(request: Request, disconnected: asyncio.Event) -> None:
+    """
+    Set `disconnected` as soon as the client goes away, independently of
+    when the next event is sent
+    """
+    while not await request.is_disconnected():
+        await asyncio.sleep(settings.SSE_DISCONNECT_POLL_MS / 1000)
+    disconnected.set()
+
+async def follow_generation(
+    request: Request,
+    generation: Generation,
+    after: int = 0
+):
+    """
+    SSE events of a chat turn after sequence number `after`, each with an
+    `id` a reconnecting client can send back as Last-Event-ID
+    """
+    generation.attach()
+    disconnected = asyncio.Event()
+    watcher = asyncio.create_task(watch_disconnect(request, disconnected))
+    started = time.perf_counter()
+    # Time to first token is only meaningful for the connection that started the turn
+    first_token_sent = after > 0
+    stream_id = next(_stream_ids)
+    _open_streams[stream_id] = started
+
+    try:
+        async for event_id, event_type, payload in close_on(generation.follow(after), disconnected):
+            yield {
+                "id": event_id,
+                "event": event_type,
+                "data": json.dumps(payload)
+            }
+
+            if event_type == "assistant_message" and not first_token_sent:
+                first_token_sent = True
+                SSE_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started)
+    except StreamInterrupted:
+        pass
+    finally:
+        watcher.cancel()
+        generation.detach()
+        del _open_streams[stream_id]
+        SSE_STREAM_DURATION.observe(time.perf_counter() - started)
+
 @router.get("/history")
 async def get_chat_history(
     chat_id: str,
     bot_id: str,
+    before: Optional[str] = Query(None, description="Return messages older than this message_id"),
+    after: Optional[str] = Query(None, description="Return messages newer than this message_id"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.CHAT_HISTORY_PAGE_MAX),
+    include_versions: bool = True,
+    include_deleted: bool = True,
     db=Depends(get_database)
 ) -> ChatHistory:
     service = ChatService(db)
-    return await service.get_chat_history(chat_id, bot_id)
+    return await service.get_chat_history(
+        chat_id,
+        bot_id,
+        before=before,
+        after=after,
+        limit=limit,
+        include_versions=include_versions,
+        include_deleted=include_deleted
+    )
 
 @router.put("/message")
 async def edit_message(
     edit_data: MessageEdit,
     db=Depends(get_database)
-) -> ChatHistory:
+) -> Union[ChatHistory, HistoryMessage]:
     service = ChatService(db)
     return await service.edit_message(edit_data)
 
@@ -39,22 +146,52 @@ async def edit_message(
 async def chat_endpoint(
     request: Request,
     message_data: MessageCreate,
-    db=Depends(get_database)
+    stream_mode: Optional[StreamMode] = None,
+    accept: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
+    db=Depends(get_database),
+    llm: LLMClient = Depends(get_llm_client)
 ):
-    async def event_generator():
-        service = ChatService(db)
-        
-        async for event_type, data in service.process_message(message_data):
-            if await request.is_disconnected():
-                break
-                
-            yield {
-                "event": event_type,
-                "data": json.dumps(data)
-            }
-            
-            # Add small delay for streaming effect
-            if event_type == "assistant_message":
-                await asyncio.sleep(0.1)
+    if last_event_id is not None:
+        # A reconnect picks up the turn it was following instead of starting over
+        resume_point = parse_event_id(last_event_id)
+        if resume_point is None:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+        message_id, after = resume_point
+        generation = generations.get(message_id)
+        if generation is None or (generation.chat_id, generation.bot_id) != (message_data.chat_id, message_data.bot_id):
+            SSE_RESUMES.inc(result="expired")
+            raise HTTPException(status_code=404, detail="Chat turn not found or no longer resumable")
+        SSE_RESUMES.inc(result="resumed")
+        return EventSourceResponse(follow_generation(request, generation, after))
+
+    mode = negotiate_stream_mode(stream_mode, accept, StreamMode(settings.SSE_DEFAULT_STREAM_MODE))
+    try:
+        # Shed with a plain 429 while the status can still be set; a call
+        # rejected later while waiting gets an `error` event in the stream
+        admission.check(message_data.bot_id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests: {e.reason}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
 
-    return EventSourceResponse(event_generator()) 
\ No newline at end of file
+    generation = Generation(
+        str(uuid.uuid4()),
+        message_data.chat_id,
+        message_data.bot_id,
+        StreamEncoder(mode, settings.SSE_CHECKPOINT_INTERVAL),
+        max_events=settings.SSE_RESUME_BUFFER_EVENTS,
+        grace=settings.SSE_RESUME_GRACE_SECONDS
+    )
+    service = ChatService(db, llm)
+    events = pace_deltas(
+        service.process_message(message_data, generation.abandoned, generation.message_id),
+        policy=PacingPolicy(settings.SSE_PACING),
+        frame_rate=settings.SSE_PACING_FRAME_RATE,
+        max_chars=settings.SSE_COALESCE_MAX_CHARS,
+        window=settings.SSE_COALESCE_WINDOW_MS / 1000
+    )
+    generations.start(generation, events)
+    return EventSourceResponse(follow_generation(request, generation))
@@ -0,0 +1,231 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+
+# Suggested retry delay when the wait queue is full
+QUEUE_FULL_RETRY_AFTER_SECONDS = 1.0
+
+ADMISSION_WAIT = Histogram(
+    "llm_admission_wait_seconds",
+    "Time LLM calls waited for a rate limit or a concurrency slot before starting"
+)
+ADMISSION_REJECTED = Counter(
+    "llm_admission_rejected_total",
+    "LLM calls shed by admission control",
+    ["reason"]
+)
+
+
+class AdmissionRejected(Exception):
+    """
+    An LLM call was shed instead of admitted; `retry_after` is a hint in
+    seconds for when trying again may succeed
+    """
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"LLM call rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units per minute and holds at most one minute's
+    worth. The level may go negative: a reservation or a charge for usage
+    that is only known afterwards is paid back by later refills.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.clock = clock
+        self.level = per_minute
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float = 0.0) -> float:
+        """
+        Seconds until the bucket holds `amount` units
+        """
+        self._refill()
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+
+@dataclass
+class Ticket:
+    """
+    An admitted LLM call
+    """
+    bot_id: Optional[str]
+    waited: float
+    tokens: Optional[TokenBucket] = None
+
+    def charge(self, tokens: int) -> None:
+        """
+        Count tokens used by the call against the bot's tokens per minute
+        """
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+
+class AdmissionController:
+    """
+    Admission control for LLM calls.
+
+    At most `max_concurrency` calls run at once; up to `max_queue` more wait
+    for a slot, and further calls are rejected right away. Each bot also has
+    a requests-per-minute bucket, from which every call reserves its turn,
+    and a tokens-per-minute bucket that is charged with the tokens actually
+    used and must be out of debt before the bot's next call starts. A call
+    that could not start within `timeout` seconds is rejected.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        timeout: float,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.clock = clock
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._requests: Dict[str, TokenBucket] = {}
+        self._tokens: Dict[str, TokenBucket] = {}
+        self.queued = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+
+    def _buckets(self, bot_id: Optional[str]):
+        if bot_id is None:
+            return None, None
+        requests = tokens = None
+        if self.requests_per_minute:
+            requests = self._requests.get(bot_id)
+            if requests is None:
+                requests = self._requests[bot_id] = TokenBucket(self.requests_per_minute, self.clock)
+        if self.tokens_per_minute:
+            tokens = self._tokens.get(bot_id)
+            if tokens is None:
+                tokens = self._tokens[bot_id] = TokenBucket(self.tokens_per_minute, self.clock)
+        return requests, tokens
+
+    def _reject(self, reason: str, retry_after: float) -> AdmissionRejected:
+        ADMISSION_REJECTED.inc(reason=reason)
+        return AdmissionRejected(reason, retry_after)
+
+    def _rate_wait(self, requests: Optional[TokenBucket], tokens: Optional[TokenBucket]) -> float:
+        return max(
+            requests.wait_time(1) if requests else 0.0,
+            tokens.wait_time() if tokens else 0.0
+        )
+
+    def _queue_full(self) -> bool:
+        return self.queued >= self.max_queue and self._slots.locked()
+
+    async def _acquire_slot(self, timeout: float) -> None:
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject("queue_full", QUEUE_FULL_RETRY_AFTER_SECONDS)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout", QUEUE_FULL_RETRY_AFTER_SECONDS)
+        finally:
+            self.queued -= 1
+
+    def check(self, bot_id: Optional[str] = None) -> None:
+        """
+        Raise AdmissionRejected if a call for `bot_id` would be shed right
+        now, without reserving anything
+        """
+        if self._queue_full():
+            raise self._reject("queue_full", QUEUE_FULL_RETRY_AFTER_SECONDS)
+        wait = self._rate_wait(*self._buckets(bot_id))
+        if wait > self.timeout:
+            raise self._reject("rate_limited", wait)
+
+    @asynccontextmanager
+    async def admit(self, bot_id: Optional[str] = None) -> AsyncIterator[Ticket]:
+        """
+        Wait for the bot's rate limits and a concurrency slot, and hold the
+        slot until the block exits
+        """
+        self.check(bot_id)
+        started = self.clock()
+        requests, tokens = self._buckets(bot_id)
+
+        wait = self._rate_wait(requests, tokens)
+        if requests:
+            # Reserving gives concurrent calls of one bot distinct start times
+            # instead of all waking for the same refill
+            requests.take(1)
+        if wait > 0:
+            self.rate_limited += 1
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                if requests:
+                    requests.take(-1)
+                raise
+            finally:
+                self.rate_limited -= 1
+
+        try:
+            await self._acquire_slot(started + self.timeout - self.clock())
+        except BaseException:
+            if requests:
+                requests.take(-1)
+            raise
+
+        waited = self.clock() - started
+        ADMISSION_WAIT.observe(waited)
+        self.in_flight += 1
+        try:
+            yield Ticket(bot_id, waited, tokens)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+
+admission = AdmissionController(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    max_queue=settings.LLM_ADMISSION_QUEUE_SIZE,
+    timeout=settings.LLM_ADMISSION_TIMEOUT_SECONDS,
+    requests_per_minute=settings.LLM_BOT_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_BOT_TOKENS_PER_MINUTE
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "llm_admission_queue_depth",
+    "LLM calls waiting to start, by what they wait for",
+    ["waiting_for"],
+    function=lambda: {("slot",): admission.queued, ("rate_limit",): admission.rate_limited}
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "llm_admission_in_flight",
+    "LLM calls holding a concurrency slot",
+    function=lambda: {(): admission.in_flight}
+)
@@ -1,19 +1,67 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from typing import Optional
 from fastapi import HTTPException, Request, Depends
 from passlib.context import CryptContext
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
-from app.crud.bot_info import BotInfoCRUD
+from app.core.config import settings
+from app.crud.bot_cache import bot_info_cache
 from app.database.mongodb import get_database
 
+ADMIN_TOKEN_HEADER = "admin-token"
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is deliberately slow; run it off the event loop on a bounded pool
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.AUTH_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+
+# Without a configured secret, tokens are only valid on the worker that issued them
+_token_secret = (settings.ADMIN_TOKEN_SECRET or secrets.token_hex(32)).encode()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
+
+def _sign(payload: str, hashed_password: str) -> str:
+    # Binding the signature to the stored hash revokes tokens when the password changes
+    digest = hmac.new(_token_secret, f"{payload}|{hashed_password}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+def create_admin_token(bot_id: str, hashed_password: str, ttl: Optional[float] = None) -> str:
+    """
+    Short-lived token proving a successful password check for one bot
+    """
+    expires_at = int(time.time() + (settings.ADMIN_TOKEN_TTL_SECONDS if ttl is None else ttl))
+    payload = f"{bot_id}.{expires_at}"
+    return f"{payload}.{_sign(payload, hashed_password)}"
+
+def verify_admin_token(token: str, bot_id: str, hashed_password: str) -> bool:
+    token_bot_id, _, rest = token.partition(".")
+    expires_at, _, signature = rest.partition(".")
+    if token_bot_id != bot_id or not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(signature, _sign(f"{token_bot_id}.{expires_at}", hashed_password))
+
 def require_admin_auth(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
@@ -26,16 +74,25 @@ def require_admin_auth(func):
             raise HTTPException(status_code=500, detail="Internal server error")
 
         admin_password = request.headers.get('admin-password')
+        admin_token = request.headers.get(ADMIN_TOKEN_HEADER)
 
-        if not admin_password:
+        if not admin_password and not admin_token:
             raise HTTPException(status_code=401, detail="Admin password is required")
 
         if bot_id:
             # For update operations, verify against existing password
-            crud = BotInfoCRUD(db)
-            bot_info = await crud.get_bot_by_id(bot_id)
-            if not bot_info or not verify_password(admin_password, bot_info.get('admin_password', '')):
+            bot = await bot_info_cache.get(db, bot_id)
+            hashed_password = bot.bot_info.get('admin_password', '') if bot else None
+            if not hashed_password:
                 raise HTTPException(status_code=401, detail="Invalid admin password")
 
+            if not (admin_token and verify_admin_token(admin_token, bot_id, hashed_password)):
+                if not admin_password or not await verify_password_async(admin_password, hashed_password):
+                    raise HTTPException(status_code=401, detail="Invalid admin password")
+                # Let the client skip bcrypt on its next calls
+                response = kwargs.get('response')
+                if response is not None:
+                    response.headers[ADMIN_TOKEN_HEADER] = create_admin_token(bot_id, hashed_password)
+
         return await func(*args, **kwargs)
-    return wrapper
\ No newline at end of file
+    return wrapper
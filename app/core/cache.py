@@ -0,0 +1,103 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Mapping, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.core.metrics import Counter
+
+CACHE_HITS = Counter("cache_hits_total", "In-process cache hits", ["cache"])
+CACHE_MISSES = Counter("cache_misses_total", "In-process cache misses", ["cache"])
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with least-recently-used eviction and a
+    per-entry time to live
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is not _MISSING:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                CACHE_HITS.inc(cache=self.name)
+                return value
+            del self._entries[key]
+        CACHE_MISSES.inc(cache=self.name)
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def hits(self) -> float:
+        return CACHE_HITS.get(cache=self.name)
+
+    @property
+    def misses(self) -> float:
+        return CACHE_MISSES.get(cache=self.name)
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    """
+    A JSON response body serialized once, with an ETag derived from it
+    """
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_content(cls, content: Any) -> "CachedBody":
+        # Same serialization as FastAPI's JSONResponse
+        body = json.dumps(
+            jsonable_encoder(content),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":")
+        ).encode("utf-8")
+        return cls(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def cached_response(request: Request, cached: CachedBody, headers: Optional[Mapping[str, str]] = None) -> Response:
+    """
+    200 with the cached body, or 304 without it when the client already has
+    this version
+    """
+    response_headers = {**(headers or {}), "ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=response_headers)
+    return Response(cached.body, media_type="application/json", headers=response_headers)
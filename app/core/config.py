@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -8,10 +9,121 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str
     MONGODB_DB_NAME: str = "chatbot_db"
+    # Create the indexes declared by the CRUD classes on startup
+    MONGODB_ENSURE_INDEXES: bool = True
+    # Client options; unset values fall back to the URL options and the driver defaults
+    MONGODB_MAX_POOL_SIZE: Optional[int] = None
+    MONGODB_MIN_POOL_SIZE: Optional[int] = None
+    MONGODB_MAX_IDLE_TIME_MS: Optional[int] = None
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = None
+    # Comma-separated, in order of preference, e.g. "zstd,snappy,zlib"
+    MONGODB_COMPRESSORS: Optional[str] = None
+    # e.g. "secondaryPreferred" to serve chat history from secondaries
+    MONGODB_HISTORY_READ_PREFERENCE: Optional[str] = None
+    # Write concern of the messages saved after a streamed reply, e.g. "1" or "majority"
+    MONGODB_STREAM_WRITE_CONCERN: Optional[str] = None
+    # Save chat turns in the background in batches instead of before `done`
+    CHAT_WRITE_BEHIND: bool = False
+    WRITE_BEHIND_MAX_PENDING: int = 10000
+    WRITE_BEHIND_BATCH_SIZE: int = 500
+    WRITE_BEHIND_FLUSH_INTERVAL_MS: int = 20
+    WRITE_BEHIND_MAX_ATTEMPTS: int = 5
+    WRITE_BEHIND_SHUTDOWN_TIMEOUT_SECONDS: float = 10
+    # "embedded" keeps messages inside the conversation document,
+    # "collection" stores them one per document in chat_messages
+    MESSAGE_STORAGE: str = "embedded"
+    CHAT_HISTORY_MAX_MESSAGES: int = 50
+    CHAT_HISTORY_PAGE_MAX: int = 200
+
+    # Admin authentication
+    AUTH_HASH_WORKERS: int = 4
+    ADMIN_TOKEN_SECRET: Optional[str] = None
+    ADMIN_TOKEN_TTL_SECONDS: int = 900
+
+    # Bot info cache
+    BOT_CACHE_MAX_SIZE: int = 1024
+    BOT_CACHE_TTL_SECONDS: float = 60.0
+    BOT_CACHE_CHANGE_STREAM: bool = True
+    BOT_LIST_PAGE_MAX: int = 1000
+
+    # Replies to the first turn of a conversation, reused for the same bot,
+    # prompt and normalized message
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_MAX_SIZE: int = 10000
+    RESPONSE_CACHE_TTL_SECONDS: float = 86400
+    # Also keep replies in MongoDB, shared by all workers
+    RESPONSE_CACHE_PERSISTENT: bool = False
+    # Generate replies to a bot's action items whenever its content changes
+    STARTER_ANSWERS_PRECOMPUTE: bool = False
+
+    # Prompt context window
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_SUMMARY_ENABLED: bool = False
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 300
     OPENAI_API_KEY: str
+
+    # OpenAI client (one shared, pooled client per process)
+    OPENAI_BASE_URL: Optional[str] = None
+    OPENAI_MODEL: str = "gpt-4o-mini"
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_READ_TIMEOUT_SECONDS: float = 60.0
+    LLM_HTTP2: bool = True
+    LLM_MAX_CONCURRENCY: int = 64
+    LLM_MAX_RETRIES: int = 2
+
+    # LLM gateway
+    # Endpoints besides "default" (OPENAI_BASE_URL, OPENAI_API_KEY, OPENAI_MODEL), as JSON:
+    # {"backup": {"base_url": "...", "api_key": "...", "model": "..."}}; omitted keys fall back to the default's
+    LLM_ENDPOINTS: Dict[str, Dict[str, str]] = {}
+    # Endpoints tried in order for bots without their own `llm_endpoints`
+    LLM_DEFAULT_ENDPOINTS: List[str] = ["default"]
+    # Retries per endpoint of a stream that failed before its first token
+    LLM_STREAM_RETRIES: int = 2
+    LLM_RETRY_BACKOFF_MS: int = 200
+    # Start a second request when the first produced no token within this time
+    LLM_HEDGE_AFTER_MS: Optional[int] = None
+
+    # LLM admission control
+    # Calls waiting for one of the LLM_MAX_CONCURRENCY slots; more are rejected
+    LLM_ADMISSION_QUEUE_SIZE: int = 256
+    # Longest a call may wait for rate limits and a slot before it is rejected
+    LLM_ADMISSION_TIMEOUT_SECONDS: float = 10.0
+    # Per-bot limits; unset means unlimited
+    LLM_BOT_REQUESTS_PER_MINUTE: Optional[int] = None
+    LLM_BOT_TOKENS_PER_MINUTE: Optional[int] = None
+
+    # SSE streaming
+    SSE_DEFAULT_STREAM_MODE: str = "full"
+    SSE_CHECKPOINT_INTERVAL: int = 64
+    SSE_COALESCE_MAX_CHARS: int = 0
+    SSE_COALESCE_WINDOW_MS: int = 0
+    SSE_PACING: str = "none"
+    SSE_PACING_FRAME_RATE: float = 20.0
+    # How often a stream checks whether its client is still connected
+    SSE_DISCONNECT_POLL_MS: int = 100
+    # Frames of each chat turn kept for clients resuming with Last-Event-ID
+    SSE_RESUME_BUFFER_EVENTS: int = 512
+    # How long a finished turn can still be resumed
+    SSE_RESUME_TTL_SECONDS: int = 60
+    SSE_RESUME_MAX_GENERATIONS: int = 1000
+    # How long a turn keeps generating with no client attached. Above zero a
+    # client can reconnect to a running turn, but the upstream stream of a
+    # client that never comes back is only closed once this has passed
+    SSE_RESUME_GRACE_SECONDS: float = 0.0
+    # Include the per-stage timings of the turn in the `done` event
+    CHAT_SERVER_TIMING: bool = False
+
+    # Logging
+    # One JSON object per line instead of the plain text format
+    LOG_JSON: bool = False
+    # Records waiting for the logging thread; further records are dropped
+    LOG_QUEUE_MAX_SIZE: int = 10000
     
     class Config:
         env_file = ".env"
         case_sensitive = True
 
-settings = Settings() 
\ No newline at end of file
+settings = Settings() 
@@ -10,6 +10,17 @@ Bot Description:
 THIS_MESSAGE_WAS_DELETED = "This message was deleted"
 NO_BOT_DESCRIPTION = "No bot description provided"
 
+# Context window related constants
+CONVERSATION_SUMMARY_PREFIX = "Summary of the earlier conversation:"
+SUMMARY_PROMPT_TEMPLATE = """
+Update the summary of a conversation between a user and an AI assistant with the new messages below.
+Keep facts, names, decisions and open questions the assistant may need later. Reply with the summary only, in 150 words or less.
+Current summary:
+{summary}
+New messages:
+{messages}
+"""
+
 # Logging related constants
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 LOG_FILE_MAX_BYTES = 10485760  # 10MB
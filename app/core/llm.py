@@ -0,0 +1,271 @@
+import asyncio
+import importlib.util
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import Counter
+
+LLM_REQUESTS = Counter("llm_requests_total", "Chat completion requests", ["model", "kind"])
+LLM_ERRORS = Counter("llm_errors_total", "Failed chat completion requests", ["model", "error"])
+# Streamed replies count one token per content chunk, as OpenAI sends them
+LLM_COMPLETION_TOKENS = Counter("llm_completion_tokens_total", "Tokens generated by the model", ["model"])
+LLM_PROMPT_TOKENS = Counter("llm_prompt_tokens_total", "Prompt tokens reported by the API", ["model"])
+LLM_RETRIES = Counter("llm_retries_total", "Streams retried after failing before their first token", ["endpoint"])
+LLM_FAILOVERS = Counter("llm_failovers_total", "Streams moved on to the next endpoint after this one failed", ["endpoint"])
+LLM_HEDGES = Counter(
+    "llm_hedged_requests_total",
+    "Hedged stream requests, by which request produced the first token",
+    ["winner"]
+)
+
+DEFAULT_ENDPOINT = "default"
+
+
+@dataclass
+class Endpoint:
+    name: str
+    client: AsyncOpenAI
+    model: str
+
+
+class LLMClient:
+    """
+    Application-scoped OpenAI client.
+
+    A single AsyncOpenAI instance (and therefore a single httpx connection
+    pool) is shared by every request so upstream connections and TLS sessions
+    are reused instead of being re-established per chat turn. How many calls
+    run at once is decided by admission control (app.core.admission).
+    """
+    client: Optional[AsyncOpenAI] = None
+
+    def __init__(self):
+        self.endpoints: Dict[str, Endpoint] = {}
+
+    async def connect(self):
+        http2 = settings.LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+        http_client = DefaultAsyncHttpxClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                settings.LLM_READ_TIMEOUT_SECONDS,
+                connect=settings.LLM_CONNECT_TIMEOUT_SECONDS,
+            ),
+        )
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=settings.LLM_MAX_RETRIES,
+            http_client=http_client,
+        )
+        self.endpoints = {DEFAULT_ENDPOINT: Endpoint(DEFAULT_ENDPOINT, self.client, settings.OPENAI_MODEL)}
+        # Further endpoints share the connection pool
+        for name, config in settings.LLM_ENDPOINTS.items():
+            client = AsyncOpenAI(
+                api_key=config.get("api_key", settings.OPENAI_API_KEY),
+                base_url=config.get("base_url", settings.OPENAI_BASE_URL),
+                max_retries=settings.LLM_MAX_RETRIES,
+                http_client=http_client,
+            )
+            self.endpoints[name] = Endpoint(name, client, config.get("model", settings.OPENAI_MODEL))
+        logger.info(f"OpenAI client ready (http2={http2}, endpoints={', '.join(self.endpoints)})")
+
+    async def close(self):
+        if self.client is not None:
+            # Closes the shared connection pool of every endpoint
+            await self.client.close()
+            self.client = None
+            self.endpoints = {}
+            logger.info("OpenAI client closed.")
+
+    async def chat_completion(self, **kwargs: Any) -> str:
+        """
+        Run a non-streaming chat completion and return the reply text
+        """
+        if self.client is None:
+            await self.connect()
+
+        model = kwargs.get("model", "")
+        LLM_REQUESTS.inc(model=model, kind="completion")
+        try:
+            response = await self.client.chat.completions.create(**kwargs)
+        except Exception as e:
+            LLM_ERRORS.inc(model=model, error=type(e).__name__)
+            raise
+        if response.usage is not None:
+            LLM_PROMPT_TOKENS.inc(response.usage.prompt_tokens, model=model)
+            LLM_COMPLETION_TOKENS.inc(response.usage.completion_tokens, model=model)
+        return response.choices[0].message.content or ""
+
+    async def stream_chat_completion(
+        self,
+        endpoint: str = DEFAULT_ENDPOINT,
+        max_retries: Optional[int] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        """
+        Stream a chat completion from `endpoint` (with its model unless one is
+        given), closing the upstream stream once it is fully consumed or the
+        caller stops iterating
+        """
+        if self.client is None:
+            await self.connect()
+
+        target = self.endpoints[endpoint]
+        client = target.client if max_retries is None else target.client.with_options(max_retries=max_retries)
+        kwargs.setdefault("model", target.model)
+        model = kwargs["model"]
+        LLM_REQUESTS.inc(model=model, kind="stream")
+        tokens = 0
+        try:
+            stream = await client.chat.completions.create(stream=True, **kwargs)
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        tokens += 1
+                    yield chunk
+            finally:
+                await stream.close()
+        except Exception as e:
+            LLM_ERRORS.inc(model=model, error=type(e).__name__)
+            raise
+        finally:
+            LLM_COMPLETION_TOKENS.inc(tokens, model=model)
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether the same request may succeed when sent again
+    """
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError))
+
+
+def _has_token(chunk: Any) -> bool:
+    return bool(chunk.choices and chunk.choices[0].delta.content)
+
+
+class LLMGateway:
+    """
+    Streams chat completions over an ordered list of endpoints.
+
+    Until a stream has produced its first token it can be replaced without
+    the caller noticing: retryable failures are retried with jittered
+    exponential backoff, then the next endpoint is tried. With `hedge_after`
+    set, a request that has produced no token by then gets a twin, and the
+    first of the two to produce a token is used while the other is cancelled.
+    Once tokens have been passed on, errors reach the caller as before.
+    """
+
+    def __init__(
+        self,
+        llm: LLMClient,
+        retries: int = settings.LLM_STREAM_RETRIES,
+        backoff: float = settings.LLM_RETRY_BACKOFF_MS / 1000,
+        hedge_after: Optional[float] = None if settings.LLM_HEDGE_AFTER_MS is None else settings.LLM_HEDGE_AFTER_MS / 1000
+    ):
+        self.llm = llm
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+
+    async def stream_chat_completion(self, endpoints: Sequence[str], **kwargs: Any) -> AsyncIterator[Any]:
+        if self.llm.client is None:
+            await self.llm.connect()
+        names = [name for name in endpoints if name in self.llm.endpoints]
+        if len(names) < len(endpoints):
+            logger.warning(f"Unknown LLM endpoints skipped: {', '.join(set(endpoints) - set(names))}")
+        if not names:
+            names = [DEFAULT_ENDPOINT]
+
+        error: Optional[BaseException] = None
+        for position, name in enumerate(names):
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    LLM_RETRIES.inc(endpoint=name)
+                    await asyncio.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+                try:
+                    head, stream = await self._first_token(name, kwargs)
+                except Exception as e:
+                    error = e
+                    logger.warning(f"LLM endpoint {name} failed before the first token: {e}")
+                    if not is_retryable(e):
+                        break
+                    continue
+
+                try:
+                    for chunk in head:
+                        yield chunk
+                    async for chunk in stream:
+                        yield chunk
+                finally:
+                    await stream.aclose()
+                return
+            if position + 1 < len(names):
+                LLM_FAILOVERS.inc(endpoint=name)
+        raise error
+
+    async def _open(self, name: str, kwargs: Dict[str, Any]) -> Tuple[List[Any], AsyncIterator[Any]]:
+        """
+        Start a stream and read it up to its first token
+        """
+        stream = self.llm.stream_chat_completion(endpoint=name, max_retries=0, **kwargs)
+        head = []
+        try:
+            async for chunk in stream:
+                head.append(chunk)
+                if _has_token(chunk):
+                    break
+        except BaseException:
+            await stream.aclose()
+            raise
+        return head, stream
+
+    async def _first_token(self, name: str, kwargs: Dict[str, Any]) -> Tuple[List[Any], AsyncIterator[Any]]:
+        attempts = [asyncio.create_task(self._open(name, kwargs))]
+        winner = None
+        try:
+            if self.hedge_after is not None:
+                done, _ = await asyncio.wait(attempts, timeout=self.hedge_after)
+                if not done:
+                    attempts.append(asyncio.create_task(self._open(name, kwargs)))
+
+            pending = set(attempts)
+            while winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in attempts if task in done and task.exception() is None]
+                if succeeded:
+                    winner = succeeded[0]
+                elif not pending:
+                    # Every request failed; report the first one's error
+                    return attempts[0].result()
+
+            if len(attempts) > 1:
+                LLM_HEDGES.inc(winner="primary" if winner is attempts[0] else "hedge")
+            return winner.result()
+        finally:
+            losers = [task for task in attempts if task is not winner]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+            for task in losers:
+                # Finished at the same moment as the winner; close its stream
+                if not task.cancelled() and task.exception() is None:
+                    await task.result()[1].aclose()
+
+
+llm_client = LLMClient()
+
+async def get_llm_client() -> LLMClient:
+    return llm_client
@@ -1,8 +1,108 @@
+import atexit
+import copy
+import json
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import IO, List, Optional, Tuple
+from app.core.config import settings
 from app.core.constants import LOG_FORMAT, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUP_COUNT
+from app.core.metrics import Counter
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+    ["level"]
+)
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, including any fields passed through `extra`
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without ever blocking the caller;
+    when the queue is full the record is dropped and counted
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message while its arguments are still current. The
+        # queue never leaves the process, so unlike the base class the
+        # traceback is passed along and formatted on the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(level=record.levelname)
+
+
+class LogListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room so a full queue cannot prevent shutdown
+        self.queue.put(self._sentinel)
+
+
+def build_handlers(
+    log_file: Path,
+    json_format: bool,
+    stream: Optional[IO] = None
+) -> List[logging.Handler]:
+    """
+    Console and rotating file handlers that do the actual output
+    """
+    formatter = JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT)
+
+    console_handler = logging.StreamHandler(stream or sys.stdout)
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(formatter)
+
+    file_handler = RotatingFileHandler(
+        log_file,
+        maxBytes=LOG_FILE_MAX_BYTES,
+        backupCount=LOG_FILE_BACKUP_COUNT
+    )
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(formatter)
+    return [console_handler, file_handler]
+
+
+def queue_handlers(handlers: List[logging.Handler], max_size: int) -> Tuple[QueueHandler, QueueListener]:
+    """
+    Put `handlers` behind a bounded queue drained by a background thread, so
+    formatting output and file I/O happen off the event loop
+    """
+    log_queue = queue.Queue(maxsize=max_size)
+    listener = LogListener(log_queue, *handlers, respect_handler_level=True)
+    return DroppingQueueHandler(log_queue), listener
+
 
 # Create logs directory if it doesn't exist
 logs_dir = Path("logs")
@@ -12,23 +112,14 @@ logs_dir.mkdir(exist_ok=True)
 logger = logging.getLogger("chatbot")
 logger.setLevel(logging.INFO)
 
-# Console handler
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
-console_format = logging.Formatter(LOG_FORMAT)
-console_handler.setFormatter(console_format)
-logger.addHandler(console_handler)
-
-# File handler
-file_handler = RotatingFileHandler(
-    logs_dir / "chatbot.log",
-    maxBytes=LOG_FILE_MAX_BYTES,
-    backupCount=LOG_FILE_BACKUP_COUNT
+queue_handler, log_listener = queue_handlers(
+    build_handlers(logs_dir / "chatbot.log", settings.LOG_JSON),
+    settings.LOG_QUEUE_MAX_SIZE
 )
-file_handler.setLevel(logging.INFO)
-file_format = logging.Formatter(LOG_FORMAT)
-file_handler.setFormatter(file_format)
-logger.addHandler(file_handler)
+logger.addHandler(queue_handler)
+log_listener.start()
+# Write out whatever is still queued when the process exits
+atexit.register(log_listener.stop)
 
 # Prevent the logger from propagating to the root logger
-logger.propagate = False 
\ No newline at end of file
+logger.propagate = False
@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from app.core.metrics import Histogram
+
+STAGE_DURATION = Histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of a chat turn",
+    ["stage"]
+)
+
+
+class Timings:
+    """
+    Durations of the stages of one request, in the order they started.
+
+    Each span is also observed in `histogram` (the per-stage histogram on
+    /metrics by default); with `histogram=None` spans are only kept on the
+    instance, which is what tests use.
+    """
+
+    def __init__(self, histogram: Optional[Histogram] = STAGE_DURATION):
+        self.histogram = histogram
+        self.spans: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+        if self.histogram is not None:
+            self.histogram.observe(seconds, stage=stage)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def server_timing(self) -> str:
+        """
+        Spans in the Server-Timing header syntax, durations in milliseconds
+        """
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.spans.items())
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.constants import NO_BOT_DESCRIPTION, SYSTEM_MESSAGE_TEMPLATE
+from app.core.logger import logger
+from app.crud.bot_info import BotInfoCRUD
+from app.crud.response_cache import normalize_message
+
+CHANGE_STREAM_RETRY_SECONDS = 5
+# Raised when change streams are used against a standalone server
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+
+def render_system_prompt(bot_info: Dict[str, Any]) -> str:
+    return SYSTEM_MESSAGE_TEMPLATE.format(
+        bot_description=bot_info.get("secondary_description") or NO_BOT_DESCRIPTION
+    )
+
+
+def action_items(bot_info: Dict[str, Any]) -> List[str]:
+    starter_message = bot_info.get("starter_message")
+    if not isinstance(starter_message, dict):
+        return []
+    return list(starter_message.get("action_items") or [])
+
+
+def starter_content_hash(bot_info: Dict[str, Any]) -> str:
+    """
+    Hash of everything the precomputed starter answers depend on
+    """
+    material = json.dumps([
+        render_system_prompt(bot_info),
+        action_items(bot_info),
+        bot_info.get("llm_endpoints") or settings.LLM_DEFAULT_ENDPOINTS
+    ])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def starter_replies(bot_info: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Precomputed replies by normalized action item, if they were computed
+    for the bot's current content
+    """
+    stored = bot_info.get("starter_answers")
+    if not stored or stored.get("content_hash") != starter_content_hash(bot_info):
+        return {}
+    return {normalize_message(answer["item"]): answer["reply"] for answer in stored.get("answers", [])}
+
+
+@dataclass
+class CachedBot:
+    bot_info: Dict[str, Any]
+    system_prompt: str
+    version: int
+    starter_replies: Dict[str, str] = field(default_factory=dict)
+
+
+class BotResponseCache:
+    """
+    Responses of the bot read endpoints, built once and kept until a bot
+    changes: each bot under its ID, and list pages under list_key()
+    """
+
+    def __init__(self):
+        self.cache = TTLCache("bot_responses", settings.BOT_CACHE_MAX_SIZE, settings.BOT_CACHE_TTL_SECONDS)
+        self._generation = 0
+
+    def list_key(self, *params: Hashable) -> tuple:
+        # Any bot change can move every page, so list keys carry the
+        # generation and invalidation makes old pages unreachable
+        return ("list", self._generation, *params)
+
+    async def get(self, key: Hashable, build: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self.cache.get(key)
+        if cached is None:
+            generation = self._generation
+            cached = await build()
+            # Don't store a response read before a concurrent invalidation
+            if generation == self._generation:
+                self.cache.set(key, cached)
+        return cached
+
+    def invalidate(self, bot_id: str) -> None:
+        self._generation += 1
+        self.cache.delete(bot_id)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self.cache.clear()
+
+
+class BotInfoCache:
+    """
+    Read-through cache of bot documents and their rendered system prompt.
+
+    Entries are dropped when this worker updates or deletes a bot, when a
+    change stream reports a change made by any worker, and in any case after
+    BOT_CACHE_TTL_SECONDS (the only bound when change streams are
+    unavailable, e.g. on a standalone MongoDB).
+    """
+
+    def __init__(self):
+        self.cache = TTLCache("bot_info", settings.BOT_CACHE_MAX_SIZE, settings.BOT_CACHE_TTL_SECONDS)
+        self.responses = BotResponseCache()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def get(self, db: AsyncIOMotorDatabase, bot_id: str) -> Optional[CachedBot]:
+        cached = self.cache.get(bot_id)
+        if cached is not None:
+            return cached
+
+        # Concurrent misses for the same bot share one database read
+        loading = self._loading.get(bot_id)
+        if loading is not None:
+            return await asyncio.shield(loading)
+
+        loading = self._loading[bot_id] = asyncio.get_running_loop().create_future()
+        generation = self._generation
+        try:
+            bot_info = await BotInfoCRUD(db).get_bot_by_id(bot_id)
+            cached = None
+            if bot_info is not None:
+                cached = CachedBot(
+                    bot_info=bot_info,
+                    system_prompt=render_system_prompt(bot_info),
+                    version=bot_info.get("version", 0),
+                    starter_replies=starter_replies(bot_info)
+                )
+                # Don't store a document read before a concurrent invalidation
+                if generation == self._generation:
+                    self.cache.set(bot_id, cached)
+            loading.set_result(cached)
+            return cached
+        except Exception as e:
+            loading.set_exception(e)
+            # Waiters get the error; mark it retrieved for this caller
+            loading.exception()
+            raise
+        finally:
+            if self._loading.get(bot_id) is loading:
+                del self._loading[bot_id]
+
+    def invalidate(self, bot_id: str) -> None:
+        self._generation += 1
+        self.cache.delete(bot_id)
+        # Later readers must not join a read that may predate the change
+        self._loading.pop(bot_id, None)
+        self.responses.invalidate(bot_id)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self.cache.clear()
+        self._loading.clear()
+        self.responses.clear()
+
+    async def start_watching(self, db: AsyncIOMotorDatabase) -> None:
+        if settings.BOT_CACHE_CHANGE_STREAM and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch(db))
+
+    async def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    async def _watch(self, db: AsyncIOMotorDatabase) -> None:
+        collection = BotInfoCRUD(db).collection
+        # Inserts only change the bot list
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        while True:
+            try:
+                async with collection.watch(pipeline) as stream:
+                    self.clear()
+                    async for change in stream:
+                        self.invalidate(str(change["documentKey"]["_id"]))
+            except PyMongoError as e:
+                if isinstance(e, OperationFailure) and e.code == CHANGE_STREAM_UNSUPPORTED:
+                    logger.warning(f"Bot cache change stream unavailable, relying on TTL: {e}")
+                    return
+                logger.error(f"Bot cache change stream failed: {e}")
+                self.clear()
+                await asyncio.sleep(CHANGE_STREAM_RETRY_SECONDS)
+
+bot_info_cache = BotInfoCache()
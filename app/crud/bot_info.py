@@ -1,10 +1,18 @@
+import re
 from bson import ObjectId
 from typing import Optional, Dict, Any, List
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorCursor, AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel, ReturnDocument
 
 from app.models.bot_info import BotInfo
 
 class BotInfoCRUD:
+    # Lookups are by _id, which MongoDB always indexes
+    indexes = [
+        # Bounds the headline_prefix filter of the listing
+        IndexModel([("headline", ASCENDING), ("_id", ASCENDING)], name="headline_id"),
+    ]
+
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         self.collection = db[BotInfo.Config.collection_name]
@@ -19,20 +27,31 @@ class BotInfoCRUD:
         """
         Update bot information in the database
         """
-        result = await self.collection.update_one(
+        return await self.collection.find_one_and_update(
             {"_id": ObjectId(bot_id)},
-            {"$set": update_data}
+            {"$set": update_data, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER
         )
-        if result.modified_count:
-            return await self.get_bot_by_id(bot_id)
-        return None
 
     async def create_bot_info(self, bot_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Create new bot information in the database
         """
-        result = await self.collection.insert_one(bot_data)
-        return await self.get_bot_by_id(str(result.inserted_id))
+        document = dict(bot_data)
+        result = await self.collection.insert_one(document)
+        # The stored document is exactly what was sent, plus its _id
+        return {**document, "_id": result.inserted_id}
+
+    async def set_starter_answers(self, bot_id: str, version: Optional[int], starter_answers: Dict[str, Any]) -> bool:
+        """
+        Store precomputed starter answers unless the bot was updated since
+        `version` was read
+        """
+        result = await self.collection.update_one(
+            {"_id": ObjectId(bot_id), "version": version},
+            {"$set": {"starter_answers": starter_answers}}
+        )
+        return result.modified_count > 0
 
     async def delete_bot_info(self, bot_id: str) -> bool:
         """
@@ -41,9 +60,29 @@ class BotInfoCRUD:
         result = await self.collection.delete_one({"_id": ObjectId(bot_id)})
         return result.deleted_count > 0
 
-    async def get_all_bots(self) -> List[Dict[str, Any]]:
+    def find_bots(
+        self,
+        after: Optional[str] = None,
+        headline_prefix: Optional[str] = None,
+        limit: Optional[int] = None,
+        projection: Optional[Dict[str, Any]] = None
+    ) -> AsyncIOMotorCursor:
+        """
+        Cursor over bots in creation order. ObjectIds grow with creation time,
+        so paging on _id continues after `after` without skipping documents.
+        """
+        query: Dict[str, Any] = {}
+        if after:
+            query["_id"] = {"$gt": ObjectId(after)}
+        if headline_prefix:
+            query["headline"] = {"$regex": f"^{re.escape(headline_prefix)}"}
+        cursor = self.collection.find(query, projection).sort("_id", ASCENDING)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    async def get_all_bots(self, projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
-        Retrieve all bots from the database
+        Retrieve all bots from the database, optionally only the projected fields
         """
-        cursor = self.collection.find({})
-        return await cursor.to_list(length=None) 
\ No newline at end of file
+        return await self.find_bots(projection=projection).to_list(length=None) 
\ No newline at end of file
@@ -1,67 +1,420 @@
-from typing import Optional, List
+from datetime import datetime
+from typing import Optional, List, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import UpdateResult
 
-from app.models.conversation import BotConversation, Message
+from app.crud.message import HISTORY_FIELDS, MessageCRUD, RECORD_PROJECTION
+from app.models.conversation import BotConversation, ConversationRecord, HistoryPage, Message, MessageRecord
+
+def _paginate(
+    messages: List[dict],
+    before: Optional[str],
+    after: Optional[str],
+    limit: Optional[int],
+    include_deleted: bool
+) -> Optional[Tuple[List[dict], bool]]:
+    """
+    In-memory counterpart of the paged queries, None if the cursor is unknown
+    """
+    cursor_id = before or after
+    if cursor_id:
+        ids = [msg["message_id"] for msg in messages]
+        if cursor_id not in ids:
+            return None
+        index = ids.index(cursor_id)
+        messages = messages[index + 1:] if after else messages[:index]
+    if not include_deleted:
+        messages = [msg for msg in messages if not msg.get("is_deleted")]
+    if limit is None:
+        return messages, False
+    page = messages[:limit] if after else messages[-limit:]
+    return page, len(messages) > limit
+
+def _merge_messages(embedded: list, split: list) -> list:
+    """
+    Embedded messages followed by split ones, without the embedded copies
+    of messages the migration already moved. Edits go to the split copy once
+    it exists, so that one is kept.
+    """
+    moved = {msg.message_id for msg in split}
+    return [msg for msg in embedded if msg.message_id not in moved] + split
 
 class ChatCRUD:
-    def __init__(self, db: AsyncIOMotorDatabase):
+    indexes = [
+        # One document per chat, which also makes concurrent first-turn upserts safe
+        IndexModel([("chat_id", ASCENDING)], unique=True, name="chat_id_unique"),
+        IndexModel([("chat_id", ASCENDING), ("messages.message_id", ASCENDING)], name="chat_id_message_id"),
+    ]
+    # Superseded by chat_id_unique, which serves the same chat_id lookups
+    retired_indexes = ["chat_id_bot_id"]
+
+    def __init__(self, db: AsyncIOMotorDatabase, split_messages: bool = False):
         self.db = db
         self.collection = db[BotConversation.Config.collection_name]
+        # With split storage new messages live in their own collection; any
+        # messages still embedded in the conversation predate the migration
+        self.messages = MessageCRUD(db) if split_messages else None
 
-    async def get_conversation(self, chat_id: str) -> Optional[BotConversation]:
-        conversation_data = await self.collection.find_one({"chat_id": chat_id})
-        if conversation_data:
-            return BotConversation(**conversation_data)
+    def _projection(self, last_n: Optional[int]) -> Optional[dict]:
+        if last_n:
+            return {"messages": {"$slice": -last_n}}
         return None
 
+    async def _load(self, query: dict, last_n: Optional[int]) -> Optional[BotConversation]:
+        conversation_data = await self.collection.find_one(query, self._projection(last_n))
+        if not conversation_data:
+            return None
+        conversation = BotConversation(**conversation_data)
+        if self.messages is not None:
+            messages = _merge_messages(
+                conversation.messages,
+                await self.messages.get_messages(conversation.chat_id, last_n)
+            )
+            conversation.messages = messages[-last_n:] if last_n else messages
+        return conversation
+
+    async def get_conversation(self, chat_id: str, last_n: Optional[int] = None) -> Optional[BotConversation]:
+        """
+        Load a conversation; with `last_n` only its most recent messages are read
+        """
+        return await self._load({"chat_id": chat_id}, last_n)
+
+    async def get_recent_conversation(self, chat_id: str, last_n: Optional[int] = None) -> Optional[ConversationRecord]:
+        """
+        Load what a chat turn needs in a single projected read: conversation
+        metadata and the `type`/`message` fields of the last `last_n` messages,
+        without validating full models or reading edit versions
+        """
+        messages = {"$slice": ["$messages", -last_n]} if last_n else "$messages"
+        pipeline = [
+            {"$match": {"chat_id": chat_id}},
+            {"$limit": 1},
+            {"$project": {
+                "_id": 0,
+                "chat_id": 1,
+                "bot_id": 1,
+                "summary": 1,
+                "summary_until": 1,
+                "messages": {"$map": {
+                    "input": {"$ifNull": [messages, []]},
+                    "as": "msg",
+                    "in": {field: f"$$msg.{field}" for field in RECORD_PROJECTION if field != "_id"}
+                }}
+            }}
+        ]
+        documents = await self.collection.aggregate(pipeline).to_list(length=1)
+        if not documents:
+            return None
+        document = documents[0]
+
+        records = [MessageRecord.from_document(msg) for msg in document["messages"]]
+        if self.messages is not None:
+            records = _merge_messages(records, await self.messages.get_recent_records(chat_id, last_n))
+            if last_n:
+                records = records[-last_n:]
+        return ConversationRecord(
+            chat_id=document["chat_id"],
+            bot_id=document["bot_id"],
+            messages=records,
+            summary=document.get("summary"),
+            summary_until=document.get("summary_until")
+        )
+
     async def get_chat_history(self, chat_id: str, bot_id: str) -> Optional[BotConversation]:
-        conversation_data = await self.collection.find_one(
-            {
-                "chat_id": chat_id,
-                "bot_id": bot_id
-            }
+        return await self._load({"chat_id": chat_id, "bot_id": bot_id}, None)
+
+    async def get_history_page(
+        self,
+        chat_id: str,
+        bot_id: str,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        include_versions: bool = True,
+        include_deleted: bool = True
+    ) -> Optional[HistoryPage]:
+        """
+        Read one page of history older than `before`, newer than `after`, or
+        the latest messages without a cursor. Windowing, filtering and
+        dropping `versions` all happen in the database.
+        """
+        if self.messages is not None:
+            return await self._get_split_history_page(
+                chat_id, bot_id, before, after, limit, include_versions, include_deleted
+            )
+
+        messages = "$messages"
+        cursor_index = None
+        if before or after:
+            cursor_index = {"$indexOfArray": ["$messages.message_id", before or after]}
+        if before:
+            messages = {"$cond": [
+                {"$gt": [cursor_index, 0]},
+                {"$slice": ["$messages", cursor_index]},
+                []
+            ]}
+        elif after:
+            messages = {"$slice": [
+                "$messages",
+                {"$add": [cursor_index, 1]},
+                {"$max": [{"$size": "$messages"}, 1]}
+            ]}
+        if not include_deleted:
+            messages = {"$filter": {"input": messages, "cond": {"$ne": ["$$this.is_deleted", True]}}}
+        if limit is not None:
+            # One extra message tells whether there is more in that direction
+            messages = {"$slice": [messages, limit + 1 if after else -(limit + 1)]}
+
+        fields = [field for field in HISTORY_FIELDS if include_versions or field != "versions"]
+        pipeline = [
+            {"$match": {"chat_id": chat_id, "bot_id": bot_id}},
+            {"$limit": 1},
+            {"$project": {
+                "_id": 0,
+                "chat_id": 1,
+                "bot_id": 1,
+                "cursor_found": {"$gte": [cursor_index, 0]} if cursor_index else {"$literal": True},
+                "messages": {"$map": {
+                    "input": messages,
+                    "as": "msg",
+                    "in": {field: f"$$msg.{field}" for field in fields}
+                }}
+            }}
+        ]
+        documents = await self.collection.aggregate(pipeline).to_list(length=1)
+        if not documents:
+            return None
+        document = documents[0]
+        if not document["cursor_found"]:
+            return HistoryPage(chat_id, bot_id, [], cursor_found=False)
+
+        page = document["messages"]
+        has_more = limit is not None and len(page) > limit
+        if has_more:
+            page = page[:limit] if after else page[-limit:]
+        return HistoryPage(
+            chat_id=chat_id,
+            bot_id=bot_id,
+            messages=page,
+            has_older=True if after else has_more,
+            has_newer=has_more if after else bool(before)
+        )
+
+    async def _get_split_history_page(
+        self,
+        chat_id: str,
+        bot_id: str,
+        before: Optional[str],
+        after: Optional[str],
+        limit: Optional[int],
+        include_versions: bool,
+        include_deleted: bool
+    ) -> Optional[HistoryPage]:
+        conversation = await self.collection.find_one(
+            {"chat_id": chat_id, "bot_id": bot_id},
+            projection={"_id": 1, "messages": {"$slice": 1}}
+        )
+        if not conversation:
+            return None
+
+        if conversation.get("messages") or limit is None:
+            # Not migrated yet (or everything was asked for): page in memory
+            full = await self._load({"_id": conversation["_id"]}, None)
+            messages = [msg.dict(include=set(HISTORY_FIELDS)) for msg in full.messages]
+            if not include_versions:
+                for msg in messages:
+                    msg.pop("versions")
+            result = _paginate(messages, before, after, limit, include_deleted)
+        else:
+            result = await self.messages.get_page(
+                chat_id, before, after, limit, include_versions, include_deleted
+            )
+
+        if result is None:
+            return HistoryPage(chat_id, bot_id, [], cursor_found=False)
+        page, has_more = result
+        return HistoryPage(
+            chat_id=chat_id,
+            bot_id=bot_id,
+            messages=page,
+            has_older=True if after else has_more,
+            has_newer=has_more if after else bool(before)
         )
-        if conversation_data:
-            return BotConversation(**conversation_data)
-        return None
 
     async def create_conversation(self, conversation: BotConversation) -> BotConversation:
-        await self.collection.insert_one(conversation.dict())
+        if self.messages is None:
+            await self.collection.insert_one(conversation.dict())
+            return conversation
+
+        await self.collection.insert_one(conversation.dict(exclude={"messages"}) | {"messages": []})
+        if conversation.messages:
+            await self.messages.insert_messages(conversation.chat_id, conversation.messages)
         return conversation
 
-    async def add_messages(self, chat_id: str, messages: List[Message]) -> bool:
+    async def update_summary(
+        self,
+        chat_id: str,
+        summary: str,
+        summary_until: str,
+        previous_until: Optional[str]
+    ) -> bool:
+        """
+        Store a new rolling summary unless another turn already advanced it
+        """
         result = await self.collection.update_one(
-            {"chat_id": chat_id},
-            {"$push": {"messages": {"$each": [msg.dict() for msg in messages]}}}
+            {"chat_id": chat_id, "summary_until": previous_until},
+            {"$set": {"summary": summary, "summary_until": summary_until}}
         )
         return result.modified_count > 0
 
+    def turn_update(self, messages: List[Message], conversation: Optional[BotConversation] = None) -> dict:
+        """
+        Update document appending a turn's messages to an embedded
+        conversation; with `conversation` it also creates it when upserted
+        """
+        update: dict = {"$push": {"messages": {"$each": [msg.dict() for msg in messages]}}}
+        if conversation is not None:
+            update["$setOnInsert"] = conversation.dict(exclude={"messages"})
+        return update
+
+    def turn_operation(
+        self,
+        chat_id: str,
+        messages: List[Message],
+        conversation: Optional[BotConversation] = None
+    ) -> UpdateOne:
+        return UpdateOne(
+            {"chat_id": chat_id},
+            self.turn_update(messages, conversation),
+            upsert=conversation is not None
+        )
+
+    async def add_messages(
+        self,
+        chat_id: str,
+        messages: List[Message],
+        conversation: Optional[BotConversation] = None
+    ) -> bool:
+        """
+        Append messages to the conversation. With `conversation` a missing
+        conversation is created from it instead of failing the write.
+        """
+        upsert = conversation is not None
+        if self.messages is not None:
+            update: dict = {"$set": {"updated_at": datetime.utcnow()}}
+            if upsert:
+                update["$setOnInsert"] = conversation.dict(exclude={"messages", "updated_at"}) | {"messages": []}
+            result = await self._update_turn(chat_id, update, upsert)
+            if result.acknowledged and not (result.matched_count or result.upserted_id):
+                return False
+            return await self.messages.insert_messages(chat_id, messages)
+
+        result = await self._update_turn(chat_id, self.turn_update(messages, conversation), upsert)
+        # Unacknowledged (w=0) writes report no result
+        return not result.acknowledged or result.modified_count > 0 or result.upserted_id is not None
+
+    async def _update_turn(self, chat_id: str, update: dict, upsert: bool) -> UpdateResult:
+        try:
+            return await self.collection.update_one({"chat_id": chat_id}, update, upsert=upsert)
+        except DuplicateKeyError:
+            # A concurrent first turn inserted the conversation; this time the update matches it
+            return await self.collection.update_one({"chat_id": chat_id}, update, upsert=upsert)
+
     async def add_message(self, chat_id: str, message: Message) -> bool:
+        if self.messages is not None:
+            return await self.add_messages(chat_id, [message])
+
         result = await self.collection.update_one(
             {"chat_id": chat_id},
             {"$push": {"messages": message.dict()}}
         )
         return result.modified_count > 0
 
-    async def update_message(self, chat_id: str, message_id: str, updated_message: str) -> bool:
-        result = await self.collection.update_one(
-            {
-                "chat_id": chat_id,
-                "messages.message_id": message_id
-            },
-            {
+    async def conversation_exists(self, chat_id: str, bot_id: str) -> bool:
+        return await self.collection.find_one({"chat_id": chat_id, "bot_id": bot_id}, projection={"_id": 1}) is not None
+
+    async def edit_message(
+        self,
+        chat_id: str,
+        message_id: str,
+        updated_message: Optional[str] = None,
+        bot_id: Optional[str] = None,
+        message_only: bool = False
+    ) -> Optional[dict]:
+        """
+        Replace the message text, or mark it deleted without `updated_message`,
+        and return `chat_id`, `bot_id` and the history `messages` as they are
+        after the write (only the edited message with `message_only`). With
+        embedded messages the write and the read are one findOneAndUpdate.
+        None if the conversation or the message does not exist.
+        """
+        query = {"chat_id": chat_id}
+        if bot_id is not None:
+            query["bot_id"] = bot_id
+
+        if self.messages is not None:
+            return await self._edit_split_message(query, message_id, updated_message, message_only)
+        return await self._edit_embedded_message(query, message_id, updated_message, message_only)
+
+    async def _edit_embedded_message(
+        self,
+        query: dict,
+        message_id: str,
+        updated_message: Optional[str],
+        message_only: bool
+    ) -> Optional[dict]:
+        if updated_message is None:
+            update = {"$set": {"messages.$.is_deleted": True}}
+        else:
+            update = {
                 "$set": {"messages.$.message": updated_message},
                 "$push": {"messages.$.versions": updated_message}
             }
+        if message_only:
+            messages = {"messages": {"$elemMatch": {"message_id": message_id}}}
+        else:
+            messages = {f"messages.{field}": 1 for field in HISTORY_FIELDS}
+        document = await self.collection.find_one_and_update(
+            {**query, "messages.message_id": message_id},
+            update,
+            projection={"_id": 0, "chat_id": 1, "bot_id": 1, **messages},
+            return_document=ReturnDocument.AFTER
         )
-        return result.modified_count > 0
+        if document is not None and message_only:
+            document["messages"] = [
+                {field: msg[field] for field in HISTORY_FIELDS if field in msg}
+                for msg in document["messages"]
+            ]
+        return document
+
+    async def _edit_split_message(
+        self,
+        query: dict,
+        message_id: str,
+        updated_message: Optional[str],
+        message_only: bool
+    ) -> Optional[dict]:
+        conversation = await self.collection.find_one(query, projection={"_id": 0, "chat_id": 1, "bot_id": 1})
+        if not conversation:
+            return None
+
+        message = await self.messages.edit_message(conversation["chat_id"], message_id, updated_message)
+        if message is None:
+            # Messages written before the migration are still embedded
+            document = await self._edit_embedded_message(query, message_id, updated_message, True)
+            if document is None:
+                return None
+            message = document["messages"][0]
+
+        if message_only:
+            return {**conversation, "messages": [message]}
+        full = await self._load(query, None)
+        return {**conversation, "messages": [msg.dict(include=set(HISTORY_FIELDS)) for msg in full.messages]}
+
+    async def update_message(self, chat_id: str, message_id: str, updated_message: str) -> bool:
+        return await self.edit_message(chat_id, message_id, updated_message, message_only=True) is not None
 
     async def delete_message(self, chat_id: str, message_id: str) -> bool:
-        result = await self.collection.update_one(
-            {
-                "chat_id": chat_id,
-                "messages.message_id": message_id
-            },
-            {"$set": {"messages.$.is_deleted": True}}
-        )
-        return result.modified_count > 0 
\ No newline at end of file
+        return await self.edit_message(chat_id, message_id, message_only=True) is not None
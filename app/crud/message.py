@@ -0,0 +1,161 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from app.models.conversation import ChatMessage, Message, MessageRecord
+
+DUPLICATE_KEY_ERROR = 11000
+MAX_INSERT_ATTEMPTS = 3
+# Migrated messages are numbered far below zero so they always sort before
+# messages written by the split storage, whichever happened first
+LEGACY_SEQ_OFFSET = 10 ** 9
+RECORD_PROJECTION = {"_id": 0, "message_id": 1, "type": 1, "message": 1, "is_deleted": 1}
+# Fields of a message as returned by the history endpoints
+HISTORY_FIELDS = ("message_id", "type", "message", "is_deleted", "interrupted", "versions")
+
+class MessageCRUD:
+    """
+    Messages stored one per document in their own collection, ordered by a
+    per-chat sequence number
+    """
+    indexes = [
+        IndexModel([("chat_id", ASCENDING), ("seq", DESCENDING)], unique=True, name="chat_id_seq"),
+        IndexModel([("chat_id", ASCENDING), ("message_id", ASCENDING)], unique=True, name="chat_id_message_id"),
+    ]
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.collection = db[ChatMessage.Config.collection_name]
+
+    async def get_last_seq(self, chat_id: str) -> int:
+        """
+        Highest sequence number used in the chat, -1 if it has no messages
+        """
+        last = await self.collection.find_one(
+            {"chat_id": chat_id},
+            projection={"seq": 1},
+            sort=[("seq", DESCENDING)]
+        )
+        return last["seq"] if last else -1
+
+    async def get_messages(self, chat_id: str, limit: Optional[int] = None) -> List[Message]:
+        """
+        Messages of the chat in order; with `limit`, only the most recent ones
+        """
+        cursor = self.collection.find({"chat_id": chat_id}).sort("seq", DESCENDING)
+        if limit:
+            cursor = cursor.limit(limit)
+        documents = await cursor.to_list(length=None)
+        return [Message(**document) for document in reversed(documents)]
+
+    async def get_recent_records(self, chat_id: str, limit: Optional[int] = None) -> List[MessageRecord]:
+        """
+        Most recent messages of the chat in order, reading only the fields
+        needed to build a prompt
+        """
+        cursor = self.collection.find(
+            {"chat_id": chat_id},
+            projection=RECORD_PROJECTION
+        ).sort("seq", DESCENDING)
+        if limit:
+            cursor = cursor.limit(limit)
+        documents = await cursor.to_list(length=None)
+        return [MessageRecord.from_document(document) for document in reversed(documents)]
+
+    async def get_page(
+        self,
+        chat_id: str,
+        before: Optional[str],
+        after: Optional[str],
+        limit: int,
+        include_versions: bool,
+        include_deleted: bool
+    ) -> Optional[Tuple[List[dict], bool]]:
+        """
+        Up to `limit` messages before or after the cursor message (the latest
+        messages without a cursor) in chronological order, plus whether more
+        exist in that direction. None if the cursor message does not exist.
+        """
+        query: dict = {"chat_id": chat_id}
+        cursor_id = before or after
+        if cursor_id:
+            cursor_message = await self.collection.find_one(
+                {"chat_id": chat_id, "message_id": cursor_id},
+                projection={"seq": 1}
+            )
+            if not cursor_message:
+                return None
+            query["seq"] = {"$gt" if after else "$lt": cursor_message["seq"]}
+        if not include_deleted:
+            query["is_deleted"] = {"$ne": True}
+
+        projection = {"_id": 0, "chat_id": 0, "seq": 0}
+        if not include_versions:
+            projection["versions"] = 0
+        documents = await self.collection.find(query, projection=projection) \
+            .sort("seq", ASCENDING if after else DESCENDING) \
+            .limit(limit + 1) \
+            .to_list(length=None)
+
+        has_more = len(documents) > limit
+        documents = documents[:limit]
+        if not after:
+            documents.reverse()
+        return documents, has_more
+
+    async def insert_messages(self, chat_id: str, messages: List[Message], start_seq: Optional[int] = None) -> bool:
+        """
+        Append messages after the current last sequence number. A concurrent
+        writer taking the same numbers is detected through the unique index
+        and the insert is retried with fresh numbers.
+        """
+        for _ in range(MAX_INSERT_ATTEMPTS):
+            if not messages:
+                return True
+            if start_seq is None:
+                start_seq = await self.get_last_seq(chat_id) + 1
+            documents = [
+                ChatMessage(**{**msg.dict(), "chat_id": chat_id, "seq": start_seq + offset}).dict(exclude={"id"})
+                for offset, msg in enumerate(messages)
+            ]
+            try:
+                await self.collection.insert_many(documents, ordered=True)
+                return True
+            except BulkWriteError as e:
+                error = e.details["writeErrors"][0]
+                if error["code"] != DUPLICATE_KEY_ERROR:
+                    raise
+                written = e.details.get("nInserted", 0)
+                if "message_id" in error.get("keyPattern", {}):
+                    # The message was already stored by an earlier attempt
+                    written += 1
+                messages = messages[written:]
+                start_seq = None
+        return False
+
+    async def edit_message(self, chat_id: str, message_id: str, updated_message: Optional[str] = None) -> Optional[dict]:
+        """
+        Replace the message text, or mark it deleted without `updated_message`,
+        and return its history fields after the write. None if it does not exist.
+        """
+        if updated_message is None:
+            update = {"$set": {"is_deleted": True, "updated_at": datetime.utcnow()}}
+        else:
+            update = {
+                "$set": {"message": updated_message, "updated_at": datetime.utcnow()},
+                "$push": {"versions": updated_message}
+            }
+        return await self.collection.find_one_and_update(
+            {"chat_id": chat_id, "message_id": message_id},
+            update,
+            projection={"_id": 0, **{field: 1 for field in HISTORY_FIELDS}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def update_message(self, chat_id: str, message_id: str, updated_message: str) -> bool:
+        return await self.edit_message(chat_id, message_id, updated_message) is not None
+
+    async def delete_message(self, chat_id: str, message_id: str) -> bool:
+        return await self.edit_message(chat_id, message_id) is not None
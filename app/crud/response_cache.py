@@ -0,0 +1,90 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.response_cache import CachedReply
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(message.casefold().split())
+
+
+def response_key(bot_id: str, system_prompt: str, endpoints: Sequence[str], message: str) -> str:
+    """
+    Cache key of a context-free turn. The prompt and endpoints are part of
+    it, so editing the bot or its models never serves an older reply.
+    """
+    material = json.dumps([bot_id, system_prompt, list(endpoints), normalize_message(message)])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class ResponseCacheCRUD:
+    indexes = [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ]
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.collection = db[CachedReply.Config.collection_name]
+
+    async def get_reply(self, key: str) -> Optional[str]:
+        # The TTL monitor only runs once a minute, so expiry is checked here too
+        document = await self.collection.find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+            {"reply": 1}
+        )
+        return document["reply"] if document else None
+
+    async def set_reply(self, key: str, bot_id: str, message: str, reply: str, ttl: float) -> None:
+        now = datetime.utcnow()
+        document = CachedReply(
+            _id=key,
+            bot_id=bot_id,
+            message=normalize_message(message),
+            reply=reply,
+            created_at=now,
+            expires_at=now + timedelta(seconds=ttl)
+        )
+        await self.collection.replace_one({"_id": key}, document.model_dump(by_alias=True), upsert=True)
+
+
+class ResponseCache:
+    """
+    Replies to context-free chat turns (the first turn of a conversation).
+
+    Entries live in an in-process LRU with a TTL and, with
+    RESPONSE_CACHE_PERSISTENT, in MongoDB as well, where every worker finds
+    them and they survive restarts. A database error only costs the hit.
+    """
+
+    def __init__(self):
+        self.cache = TTLCache("chat_responses", settings.RESPONSE_CACHE_MAX_SIZE, settings.RESPONSE_CACHE_TTL_SECONDS)
+
+    async def get(self, db: AsyncIOMotorDatabase, key: str) -> Optional[str]:
+        reply = self.cache.get(key)
+        if reply is None and settings.RESPONSE_CACHE_PERSISTENT:
+            try:
+                reply = await ResponseCacheCRUD(db).get_reply(key)
+            except PyMongoError as e:
+                logger.error(f"Response cache read failed: {e}")
+                return None
+            if reply is not None:
+                self.cache.set(key, reply)
+        return reply
+
+    async def set(self, db: AsyncIOMotorDatabase, key: str, bot_id: str, message: str, reply: str) -> None:
+        self.cache.set(key, reply)
+        if settings.RESPONSE_CACHE_PERSISTENT:
+            try:
+                await ResponseCacheCRUD(db).set_reply(key, bot_id, message, reply, settings.RESPONSE_CACHE_TTL_SECONDS)
+            except PyMongoError as e:
+                logger.error(f"Response cache write failed: {e}")
+
+response_cache = ResponseCache()
@@ -0,0 +1,243 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Coroutine, Dict, List, Optional, Set
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import Counter, Gauge, Histogram
+from app.crud.chat import ChatCRUD
+from app.database.mongodb import stream_database
+from app.models.conversation import BotConversation, Message
+
+RETRY_BACKOFF_SECONDS = 0.1
+
+PERSISTENCE_LAG = Histogram(
+    "chat_persistence_lag_seconds",
+    "Time from the end of a chat turn until its messages are stored (oldest turn of each chat per batch)"
+)
+PERSISTENCE_BATCH_SIZE = Histogram(
+    "chat_persistence_batch_size",
+    "Chats written per write-behind batch",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+PERSISTENCE_FAILURES = Counter(
+    "chat_persistence_failures_total",
+    "Chat turns dropped after exhausting write-behind retries"
+)
+
+
+@dataclass
+class PendingTurn:
+    chat_id: str
+    messages: List[Message]
+    # Set when the turn may be the first one, so the write creates the conversation
+    conversation: Optional[BotConversation] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+def merge_turns(turns: List[PendingTurn]) -> List[PendingTurn]:
+    """
+    Combine turns of the same chat into one write, keeping message order, so
+    a batch holds at most one operation per chat and can run unordered
+    """
+    merged: Dict[str, PendingTurn] = {}
+    for turn in turns:
+        current = merged.get(turn.chat_id)
+        if current is None:
+            merged[turn.chat_id] = PendingTurn(
+                turn.chat_id, list(turn.messages), turn.conversation, turn.enqueued_at, turn.attempts
+            )
+        else:
+            current.messages.extend(turn.messages)
+            current.conversation = current.conversation or turn.conversation
+            current.enqueued_at = min(current.enqueued_at, turn.enqueued_at)
+            current.attempts = max(current.attempts, turn.attempts)
+    return list(merged.values())
+
+
+class TurnWriter:
+    """
+    Write-behind queue for the messages of finished chat turns.
+
+    Turns from all chats are collected for up to WRITE_BEHIND_FLUSH_INTERVAL_MS
+    and stored with one unordered bulk write. Failed writes are retried ahead
+    of newer turns of the same chat. When the store falls behind, the bounded
+    queue makes `submit` wait, which pushes back on new turns.
+
+    Other writes that run after a response is sent are started with `spawn`,
+    so they are awaited too when the writer stops.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._retry: List[PendingTurn] = []
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def pending(self) -> int:
+        return (self._queue.qsize() if self._queue else 0) + len(self._retry)
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=settings.WRITE_BEHIND_MAX_PENDING)
+            crud = ChatCRUD(stream_database(db), split_messages=settings.MESSAGE_STORAGE == "collection")
+            self._task = asyncio.create_task(self._run(crud))
+
+    def spawn(self, coro: Coroutine) -> None:
+        """
+        Run `coro` in the background, keeping it referenced until it finishes
+        """
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def stop(self) -> None:
+        """
+        Finish the spawned tasks and store every queued turn, then stop the writer
+        """
+        try:
+            await asyncio.wait_for(self._drain(), settings.WRITE_BEHIND_SHUTDOWN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error(f"Write-behind queue not flushed, {len(self._tasks)} tasks and {self.pending} turns lost")
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _drain(self) -> None:
+        # Spawned tasks may still submit turns, so they finish first
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._task is None:
+            return
+        await self._queue.join()
+        while self._retry:
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS)
+
+    async def submit(
+        self,
+        chat_id: str,
+        messages: List[Message],
+        conversation: Optional[BotConversation] = None
+    ) -> None:
+        await self._queue.put(PendingTurn(chat_id, messages, conversation))
+
+    async def _next_batch(self) -> List[PendingTurn]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.WRITE_BEHIND_FLUSH_INTERVAL_MS / 1000
+        while len(batch) < settings.WRITE_BEHIND_BATCH_SIZE:
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self, crud: ChatCRUD) -> None:
+        while True:
+            if self._retry:
+                batch = []
+            else:
+                batch = await self._next_batch()
+            # Retried turns go first so messages of a chat stay in order
+            turns = merge_turns(self._retry + batch)
+            try:
+                failed = await self._write(crud, turns)
+            except Exception as e:
+                logger.error(f"Write-behind batch failed: {e}")
+                failed = turns
+            self._retry = self._give_up(failed)
+            for _ in batch:
+                self._queue.task_done()
+            if self._retry:
+                attempts = max(turn.attempts for turn in self._retry)
+                await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1))
+
+    def _give_up(self, turns: List[PendingTurn]) -> List[PendingTurn]:
+        retry = []
+        for turn in turns:
+            turn.attempts += 1
+            if turn.attempts < settings.WRITE_BEHIND_MAX_ATTEMPTS:
+                retry.append(turn)
+            else:
+                logger.error(f"Dropping {len(turn.messages)} messages of chat {turn.chat_id} after {turn.attempts} attempts")
+                PERSISTENCE_FAILURES.inc()
+        return retry
+
+    async def _write(self, crud: ChatCRUD, turns: List[PendingTurn]) -> List[PendingTurn]:
+        """
+        Store the turns and return those that failed
+        """
+        PERSISTENCE_BATCH_SIZE.observe(len(turns))
+        if crud.messages is not None:
+            # Split storage numbers messages per chat, so chats are written individually
+            results = await asyncio.gather(
+                *(crud.add_messages(turn.chat_id, turn.messages, turn.conversation) for turn in turns),
+                return_exceptions=True
+            )
+            failed = {index for index, result in enumerate(results) if result is not True}
+        else:
+            failed = set()
+            counts = None
+            try:
+                result = await crud.collection.bulk_write(
+                    [crud.turn_operation(turn.chat_id, turn.messages, turn.conversation) for turn in turns],
+                    ordered=False
+                )
+                # Unacknowledged (w=0) writes report no result
+                if result.acknowledged:
+                    counts = result.bulk_api_result
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details["writeErrors"]}
+                counts = e.details
+                logger.error(f"Write-behind batch stored {len(turns) - len(failed)}/{len(turns)} turns")
+            except PyMongoError as e:
+                logger.error(f"Write-behind batch failed: {e}")
+                failed = set(range(len(turns)))
+            if counts is not None and counts["nMatched"] + counts["nUpserted"] < len(turns) - len(failed):
+                failed |= await self._unmatched(crud, turns, failed)
+
+        now = time.monotonic()
+        for index, turn in enumerate(turns):
+            if index not in failed:
+                PERSISTENCE_LAG.observe(now - turn.enqueued_at)
+        return [turn for index, turn in enumerate(turns) if index in failed]
+
+    async def _unmatched(self, crud: ChatCRUD, turns: List[PendingTurn], failed: Set[int]) -> Set[int]:
+        """
+        Indexes of the appended turns whose conversation does not exist, as
+        only a chat's first turn may create it
+        """
+        appends = {
+            turn.chat_id: index for index, turn in enumerate(turns)
+            if index not in failed and turn.conversation is None
+        }
+        found = set(await crud.collection.distinct("chat_id", {"chat_id": {"$in": list(appends)}}))
+        missing = {index for chat_id, index in appends.items() if chat_id not in found}
+        for index in missing:
+            logger.error(f"Write-behind turn matched no conversation for chat {turns[index].chat_id}")
+        return missing
+
+turn_writer = TurnWriter()
+
+PERSISTENCE_QUEUE_DEPTH = Gauge(
+    "chat_persistence_queue_depth",
+    "Chat turns waiting to be stored",
+    function=lambda: {(): turn_writer.pending}
+)
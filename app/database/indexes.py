@@ -0,0 +1,123 @@
+from datetime import datetime
+from typing import Any, Iterator, List, NamedTuple, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
+
+from app.core.logger import logger
+from app.crud.bot_info import BotInfoCRUD
+from app.crud.chat import ChatCRUD
+from app.crud.message import DUPLICATE_KEY_ERROR, MessageCRUD
+from app.crud.response_cache import ResponseCacheCRUD
+
+# Every CRUD class declares the indexes its queries need in `indexes`, and
+# optionally the ones it no longer needs in `retired_indexes`
+INDEXED_CRUDS = [BotInfoCRUD, ChatCRUD, MessageCRUD, ResponseCacheCRUD]
+
+# A plan reading more documents than this per document returned (or at all
+# when it returns none) goes through an index that barely narrows the query
+MAX_DOCS_EXAMINED_RATIO = 10
+
+
+class PlanProblem(NamedTuple):
+    name: str
+    reason: str
+
+
+class QueryShape(NamedTuple):
+    """
+    Filter (and sort) of a query issued by a CRUD class. Aggregations are
+    described by their leading $match, which is what selects the index.
+    """
+    name: str
+    crud: type
+    filter: dict
+    sort: Optional[List[tuple]] = None
+
+
+QUERY_SHAPES = [
+    QueryShape("bot_info.by_id", BotInfoCRUD, {"_id": "000000000000000000000000"}),
+    QueryShape("bot_info.all", BotInfoCRUD, {}, [("_id", 1)]),
+    QueryShape("bot_info.page", BotInfoCRUD, {"_id": {"$gt": ObjectId("000000000000000000000000")}}, [("_id", 1)]),
+    QueryShape("bot_info.by_headline_prefix", BotInfoCRUD, {"headline": {"$regex": "^h"}}, [("_id", 1)]),
+    QueryShape("conversation.by_chat", ChatCRUD, {"chat_id": "c"}),
+    QueryShape("conversation.by_chat_bot", ChatCRUD, {"chat_id": "c", "bot_id": "b"}),
+    QueryShape("conversation.by_message", ChatCRUD, {"chat_id": "c", "messages.message_id": "m"}),
+    QueryShape("conversation.by_summary", ChatCRUD, {"chat_id": "c", "summary_until": None}),
+    QueryShape("message.recent", MessageCRUD, {"chat_id": "c"}, [("seq", -1)]),
+    QueryShape("message.by_id", MessageCRUD, {"chat_id": "c", "message_id": "m"}),
+    QueryShape("message.page_before", MessageCRUD, {"chat_id": "c", "seq": {"$lt": 0}}, [("seq", -1)]),
+    QueryShape("message.page_after", MessageCRUD, {"chat_id": "c", "seq": {"$gt": 0}}, [("seq", 1)]),
+    QueryShape(
+        "message.page_visible", MessageCRUD,
+        {"chat_id": "c", "is_deleted": {"$ne": True}}, [("seq", -1)]
+    ),
+    QueryShape("response_cache.by_key", ResponseCacheCRUD, {"_id": "k", "expires_at": {"$gt": datetime(2000, 1, 1)}}),
+]
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> List[str]:
+    """
+    Create the indexes declared by every CRUD class and drop the ones they
+    retired. Existing indexes with the same definition are left alone. An
+    index that cannot be built, such as a unique index over duplicate
+    documents, is logged and skipped instead of failing startup; the names
+    of those indexes are returned.
+    """
+    failed = []
+    for crud_class in INDEXED_CRUDS:
+        crud = crud_class(db)
+        retired = getattr(crud_class, "retired_indexes", [])
+        existing = await crud.collection.index_information() if retired else {}
+        for name in retired:
+            if name in existing:
+                await crud.collection.drop_index(name)
+                logger.info(f"Dropped retired index {name} on {crud.collection.name}")
+
+        ready = []
+        for index in crud_class.indexes:
+            name = index.document["name"]
+            try:
+                await crud.collection.create_indexes([index])
+            except OperationFailure as e:
+                failed.append(name)
+                hint = " Merge duplicate documents first, see scripts/dedupe_conversations.py." if e.code == DUPLICATE_KEY_ERROR else ""
+                logger.error(f"Could not build index {name} on {crud.collection.name}: {e}.{hint}")
+                continue
+            ready.append(name)
+        if ready:
+            logger.info(f"Indexes ready on {crud.collection.name}: {', '.join(ready)}")
+    return failed
+
+
+def _plan_stages(plan: Any) -> Iterator[str]:
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+
+async def find_inefficient_queries(db: AsyncIOMotorDatabase) -> List[PlanProblem]:
+    """
+    Explain every known query shape and report those whose winning plan
+    scans the whole collection, or examines far more documents than it
+    returns. The second check only bites on collections holding data.
+    """
+    problems = []
+    for shape in QUERY_SHAPES:
+        cursor = shape.crud(db).collection.find(shape.filter)
+        if shape.sort:
+            cursor = cursor.sort(shape.sort)
+        explain = await cursor.explain()
+        if "COLLSCAN" in _plan_stages(explain["queryPlanner"]["winningPlan"]):
+            problems.append(PlanProblem(shape.name, "COLLSCAN"))
+            continue
+        stats = explain.get("executionStats", {})
+        examined, returned = stats.get("totalDocsExamined", 0), stats.get("nReturned", 0)
+        if examined > max(returned, 1) * MAX_DOCS_EXAMINED_RATIO:
+            problems.append(PlanProblem(shape.name, f"examined {examined} documents to return {returned}"))
+    return problems
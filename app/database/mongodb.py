@@ -1,22 +1,79 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+import importlib.util
+from typing import Any, Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import WriteConcern
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
 from app.core.config import settings
+from app.core.logger import logger
+from app.database.monitoring import command_listener, pool_listener
 from fastapi import Depends
 
+# Python modules the driver needs for each wire compressor
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+def available_compressors(names: Optional[str]) -> List[str]:
+    """
+    Requested compressors whose library is installed, in the given order
+    """
+    compressors = []
+    for name in filter(None, (name.strip() for name in (names or "").split(","))):
+        module = COMPRESSOR_MODULES.get(name)
+        if module is None:
+            raise ValueError(f"Unknown MongoDB compressor: {name}")
+        if importlib.util.find_spec(module) is None:
+            logger.warning(f"MongoDB compressor {name} requested but {module} is not installed")
+            continue
+        compressors.append(name)
+    return compressors
+
+def client_options() -> Dict[str, Any]:
+    options: Dict[str, Any] = {"event_listeners": [pool_listener, command_listener]}
+    optional = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+    }
+    options.update({key: value for key, value in optional.items() if value is not None})
+    compressors = available_compressors(settings.MONGODB_COMPRESSORS)
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
+def history_database(db: AsyncIOMotorDatabase) -> AsyncIOMotorDatabase:
+    """
+    Database handle for chat history reads, which may be served by
+    secondaries and so lag slightly behind the latest turn
+    """
+    if not settings.MONGODB_HISTORY_READ_PREFERENCE:
+        return db
+    mode = read_pref_mode_from_name(settings.MONGODB_HISTORY_READ_PREFERENCE)
+    return db.with_options(read_preference=make_read_preference(mode, None))
+
+def stream_database(db: AsyncIOMotorDatabase) -> AsyncIOMotorDatabase:
+    """
+    Database handle for the writes made after a streamed reply
+    """
+    w = settings.MONGODB_STREAM_WRITE_CONCERN
+    if not w:
+        return db
+    return db.with_options(write_concern=WriteConcern(w=int(w) if w.isdigit() else w))
+
 class MongoDB:
     client: AsyncIOMotorClient = None
     db = None
 
     async def connect_to_database(self):
-        self.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        self.client = AsyncIOMotorClient(settings.MONGODB_URL, **client_options())
         self.db = self.client[settings.MONGODB_DB_NAME]
-        print("Connected to MongoDB!")
+        logger.info("Connected to MongoDB!")
 
     async def close_database_connection(self):
         if self.client is not None:
             self.client.close()
-            print("MongoDB connection closed.")
+            logger.info("MongoDB connection closed.")
 
 mongodb = MongoDB()
 
 async def get_database():
-    return mongodb.db 
\ No newline at end of file
+    return mongodb.db
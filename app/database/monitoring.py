@@ -0,0 +1,116 @@
+import threading
+from pymongo import monitoring
+
+from app.core.metrics import Counter, Gauge, Histogram
+
+POOL_CONNECTIONS = Gauge("mongodb_pool_connections", "Open connections in the MongoDB pool", ["address"])
+POOL_CHECKED_OUT = Gauge("mongodb_pool_checked_out", "MongoDB connections in use", ["address"])
+POOL_WAITING = Gauge("mongodb_pool_wait_queue", "Operations waiting for a MongoDB connection", ["address"])
+POOL_CHECKOUT_SECONDS = Histogram(
+    "mongodb_pool_checkout_seconds",
+    "Time to check a connection out of the MongoDB pool",
+    ["address"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total",
+    "Failed MongoDB connection checkouts",
+    ["address", "reason"]
+)
+POOL_CLEARED = Counter("mongodb_pool_cleared_total", "Times the MongoDB pool was cleared", ["address"])
+COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command round trip time",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+COMMAND_FAILURES = Counter("mongodb_command_failures_total", "Failed MongoDB commands", ["command"])
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Feeds connection pool (CMAP) events into the metrics, so pool size and
+    checkout waits can be read from /metrics when sizing the pool.
+
+    Events are published from the driver's threads, so updates are
+    serialized with a lock rather than relying on the event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            POOL_CLEARED.inc(address=_address(event))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            POOL_CONNECTIONS.inc(address=_address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            POOL_CONNECTIONS.dec(address=_address(event))
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            POOL_WAITING.inc(address=_address(event))
+
+    def connection_check_out_failed(self, event):
+        address = _address(event)
+        with self._lock:
+            POOL_WAITING.dec(address=address)
+            POOL_CHECKOUT_FAILURES.inc(address=address, reason=event.reason)
+
+    def connection_checked_out(self, event):
+        address = _address(event)
+        with self._lock:
+            POOL_WAITING.dec(address=address)
+            POOL_CHECKED_OUT.inc(address=address)
+            if event.duration is not None:
+                POOL_CHECKOUT_SECONDS.observe(event.duration, address=address)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            POOL_CHECKED_OUT.dec(address=_address(event))
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Observes the latency of every MongoDB command (find, aggregate, update,
+    ...) as reported by the driver
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        with self._lock:
+            COMMAND_DURATION.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        with self._lock:
+            COMMAND_DURATION.observe(event.duration_micros / 1e6, command=event.command_name)
+            COMMAND_FAILURES.inc(command=event.command_name)
+
+pool_listener = PoolMetricsListener()
+command_listener = CommandMetricsListener()
@@ -2,8 +2,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
+from app.core.auth import ADMIN_TOKEN_HEADER
 from app.database.mongodb import mongodb
+from app.core.llm import llm_client
+from app.database.indexes import ensure_indexes
+from app.crud.bot_cache import bot_info_cache
+from app.crud.turn_writer import turn_writer
 from app.api import api_router
+from app.api.metrics import MetricsMiddleware, router as metrics_router
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -17,19 +23,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[ADMIN_TOKEN_HEADER],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.include_router(metrics_router)
 
 @app.on_event("startup")
 async def startup_db_client():
     await mongodb.connect_to_database()
+    if settings.MONGODB_ENSURE_INDEXES:
+        # Indexes that cannot be built are logged; the service still starts
+        await ensure_indexes(mongodb.db)
+    await bot_info_cache.start_watching(mongodb.db)
+    if settings.CHAT_WRITE_BEHIND:
+        await turn_writer.start(mongodb.db)
+
+@app.on_event("startup")
+async def startup_llm_client():
+    await llm_client.connect()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await bot_info_cache.stop_watching()
+    await turn_writer.stop()
     await mongodb.close_database_connection()
 
+@app.on_event("shutdown")
+async def shutdown_llm_client():
+    await llm_client.close()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Chatbot API"} 
\ No newline at end of file
@@ -7,11 +7,22 @@ class WelcomeMessage(MongoBaseModel):
     message: str = Field(..., description="The text content of the welcome message")
     action_items: List[str] = Field(..., description="List of action items or suggestions for the user")
 
+class StarterAnswer(MongoBaseModel):
+    item: str = Field(..., description="Action item as shown to users")
+    reply: str = Field(..., description="Assistant reply generated ahead of time")
+
+class StarterAnswers(MongoBaseModel):
+    content_hash: str = Field(..., description="Hash of the prompt, action items and endpoints the replies were generated for")
+    answers: List[StarterAnswer] = Field(default_factory=list)
+
 class BotInfo(MongoBaseModel):
     headline: str = Field(..., description="The main headline/title of the bot")
     starter_message: WelcomeMessage = Field(..., description="The initial welcome message and action items shown to users")
     secondary_description: Optional[str] = Field(None, description="Additional description or details about the bot")
     logo: Optional[str] = Field(None, description="URL or path to the bot's logo image")
+    context_token_budget: Optional[int] = Field(None, description="Prompt token budget for chat turns, defaults to CONTEXT_TOKEN_BUDGET")
+    llm_endpoints: Optional[List[str]] = Field(None, description="LLM endpoints to try in order, defaults to LLM_DEFAULT_ENDPOINTS")
+    starter_answers: Optional[StarterAnswers] = Field(None, description="Precomputed replies to the action items")
 
     class Config:
         collection_name = "bot_info" 
\ No newline at end of file
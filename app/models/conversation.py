@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, NamedTuple, Optional
 from pydantic import Field
 from enum import Enum
 
@@ -14,11 +14,61 @@ class Message(MongoBaseModel):
     message: str = Field(..., description="Content of the message")
     versions: List[str] = Field(default_factory=list, description="Array of message versions for edit history")
     is_deleted: bool = Field(default=False, description="Flag to mark if message is deleted")
+    interrupted: bool = Field(default=False, description="Flag to mark a reply cut short by the client disconnecting")
 
 class BotConversation(MongoBaseModel):
     chat_id: str = Field(..., description="Unique identifier for the chat")
     bot_id: str = Field(..., description="Identifier of the bot")
     messages: List[Message] = Field(default_factory=list, description="List of messages in the conversation")
+    summary: Optional[str] = Field(None, description="Rolling summary of turns that no longer fit in the context window")
+    summary_until: Optional[str] = Field(None, description="ID of the last message covered by the summary")
 
     class Config:
-        collection_name = "bot_conversations" 
\ No newline at end of file
+        collection_name = "bot_conversations"
+
+class ChatMessage(Message):
+    chat_id: str = Field(..., description="Identifier of the chat the message belongs to")
+    seq: int = Field(..., description="Position of the message within the chat")
+
+    class Config:
+        collection_name = "chat_messages"
+
+class MessageRecord(NamedTuple):
+    """
+    Lightweight, unvalidated view of a stored message used to build prompts
+    """
+    message_id: str
+    type: str
+    message: str
+    is_deleted: bool = False
+
+    @classmethod
+    def from_document(cls, document: dict) -> "MessageRecord":
+        return cls(
+            document["message_id"],
+            document["type"],
+            document["message"],
+            document.get("is_deleted", False)
+        )
+
+class ConversationRecord(NamedTuple):
+    """
+    The parts of a conversation a chat turn needs, with only recent messages
+    """
+    chat_id: str
+    bot_id: str
+    messages: List[MessageRecord]
+    summary: Optional[str] = None
+    summary_until: Optional[str] = None
+
+class HistoryPage(NamedTuple):
+    """
+    One page of a conversation's messages in chronological order
+    """
+    chat_id: str
+    bot_id: str
+    messages: List[dict]
+    has_older: bool = False
+    has_newer: bool = False
+    cursor_found: bool = True
+
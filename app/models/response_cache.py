@@ -0,0 +1,13 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+class CachedReply(BaseModel):
+    id: str = Field(..., alias="_id", description="Hash of the bot, its prompt and the normalized message")
+    bot_id: str = Field(..., description="Identifier of the bot that gave the reply")
+    message: str = Field(..., description="Normalized user message")
+    reply: str = Field(..., description="Assistant reply to replay")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(..., description="Removed by a TTL index after this time")
+
+    class Config:
+        collection_name = "response_cache"
@@ -1,5 +1,5 @@
 from typing import Optional, List
-from pydantic import BaseModel, SecretStr
+from pydantic import BaseModel, Field, SecretStr
 from datetime import datetime
 
 class WelcomeMessage(BaseModel):
@@ -11,6 +11,9 @@ class BotInfoBase(BaseModel):
     starter_message: WelcomeMessage
     secondary_description: Optional[str] = None
     logo: Optional[str] = None
+    context_token_budget: Optional[int] = Field(None, gt=0)
+    # Names of LLM_ENDPOINTS to try in order; unset uses LLM_DEFAULT_ENDPOINTS
+    llm_endpoints: Optional[List[str]] = None
 
 class BotInfoCreate(BotInfoBase):
     admin_password: str
@@ -20,6 +23,8 @@ class BotInfoUpdate(BaseModel):
     starter_message: Optional[WelcomeMessage] = None
     secondary_description: Optional[str] = None
     logo: Optional[str] = None
+    context_token_budget: Optional[int] = Field(None, gt=0)
+    llm_endpoints: Optional[List[str]] = None
 
 class BotInfoResponse(BotInfoBase):
     id: str
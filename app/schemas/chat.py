@@ -14,6 +14,8 @@ class MessageEdit(BaseModel):
     message_id: str
     updated_value: Optional[str] = None
     is_delete: bool = False
+    # Respond with the edited message only instead of the whole history
+    message_only: bool = False
 
 class MessageResponse(BaseModel):
     message_id: str
@@ -21,23 +23,51 @@ class MessageResponse(BaseModel):
     message: str
     status: str = "received"
 
+class StreamMode(str, Enum):
+    FULL = "full"
+    DELTA = "delta"
+
+class PacingPolicy(str, Enum):
+    NONE = "none"
+    FIXED = "fixed"
+    ADAPTIVE = "adaptive"
+
 class StreamResponse(BaseModel):
     message_id: str
     delta: str
+    buffer: Optional[str] = None
+
+class StreamCheckpoint(BaseModel):
+    message_id: str
+    offset: int
     buffer: str
 
+class StreamError(BaseModel):
+    message_id: str
+    error: str
+    # Seconds after which the client may retry
+    retry_after: Optional[float] = None
+
 class CompletionResponse(BaseModel):
     message_id: str
     status: str = "completed"
+    message: Optional[str] = None
+    # Set when the reply was replayed from the response cache
+    cached: Optional[bool] = None
+    # Time spent in each stage of the turn, in Server-Timing header syntax
+    server_timing: Optional[str] = None
 
 class HistoryMessage(BaseModel):
     message_id: str
     type: MessageType
     message: str
-    versions: List[str] = []
+    versions: Optional[List[str]] = []
     is_deleted: bool = False
+    interrupted: bool = False
 
 class ChatHistory(BaseModel):
     chat_id: str
     bot_id: str
-    messages: List[HistoryMessage] = [] 
\ No newline at end of file
+    messages: List[HistoryMessage] = []
+    has_older: bool = False
+    has_newer: bool = False 
\ No newline at end of file
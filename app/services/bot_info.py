@@ -1,14 +1,31 @@
+from dataclasses import dataclass
 from fastapi import HTTPException
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Optional
 from datetime import datetime
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorCursor, AsyncIOMotorDatabase
 
 from app.crud.bot_info import BotInfoCRUD
+from app.core.cache import CachedBody
+from app.crud.bot_cache import bot_info_cache
 from app.schemas.bot import BotInfoResponse, BotInfoCreate, BotInfoUpdate, BotInfoListResponse
-from app.core.auth import get_password_hash
+from app.core.auth import get_password_hash_async
+from app.services.starter_answers import schedule_starter_answers
+
+# Fields of BotInfoListResponse; the list never reads prompts or passwords
+LIST_PROJECTION = {"headline": 1, "logo": 1, "created_at": 1}
+
+
+@dataclass(frozen=True)
+class BotListPage:
+    body: CachedBody
+    # Cursor for the following page, when this one is full
+    next_after: Optional[str] = None
+
 
 class BotInfoService:
     def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
         self.crud = BotInfoCRUD(db)
 
     async def get_bot_info(self, bot_id: str) -> BotInfoResponse:
@@ -35,6 +52,8 @@ class BotInfoService:
                 },
                 secondary_description=bot_info.get("secondary_description"),
                 logo=bot_info.get("logo"),
+                context_token_budget=bot_info.get("context_token_budget"),
+                llm_endpoints=bot_info.get("llm_endpoints"),
                 created_at=bot_info.get("created_at", datetime.utcnow())
             )
         except HTTPException as e:
@@ -48,8 +67,10 @@ class BotInfoService:
         """
         try:
             bot_info = await self.crud.update_bot_info(bot_id, update_data.model_dump(exclude_unset=True))
+            bot_info_cache.invalidate(bot_id)
             if bot_info is None:
                 raise HTTPException(status_code=404, detail="Bot not found")
+            schedule_starter_answers(self.db, bot_id)
             
             starter_message = bot_info.get("starter_message", {})
             if not isinstance(starter_message, dict):
@@ -64,6 +85,8 @@ class BotInfoService:
                 },
                 secondary_description=bot_info.get("secondary_description"),
                 logo=bot_info.get("logo"),
+                context_token_budget=bot_info.get("context_token_budget"),
+                llm_endpoints=bot_info.get("llm_endpoints"),
                 created_at=bot_info.get("created_at", datetime.utcnow())
             )
         except HTTPException as e:
@@ -78,10 +101,12 @@ class BotInfoService:
         try:
             # Hash the password before storing
             data_dict = bot_data.model_dump()
-            data_dict['admin_password'] = get_password_hash(data_dict['admin_password'])
+            data_dict['admin_password'] = await get_password_hash_async(data_dict['admin_password'])
             data_dict['created_at'] = datetime.utcnow()
             
             bot_info = await self.crud.create_bot_info(data_dict)
+            bot_info_cache.invalidate(str(bot_info["_id"]))
+            schedule_starter_answers(self.db, str(bot_info["_id"]))
             starter_message = bot_info.get("starter_message", {})
             if not isinstance(starter_message, dict):
                 starter_message = {}
@@ -95,6 +120,8 @@ class BotInfoService:
                 },
                 secondary_description=bot_info.get("secondary_description"),
                 logo=bot_info.get("logo"),
+                context_token_budget=bot_info.get("context_token_budget"),
+                llm_endpoints=bot_info.get("llm_endpoints"),
                 created_at=bot_info.get("created_at", datetime.utcnow())
             )
         except HTTPException as e:
@@ -106,24 +133,89 @@ class BotInfoService:
         """
         Service function to delete bot information
         """
-        if not await self.crud.delete_bot_info(bot_id):
+        deleted = await self.crud.delete_bot_info(bot_id)
+        bot_info_cache.invalidate(bot_id)
+        if not deleted:
             raise HTTPException(status_code=404, detail="Bot not found")
         return True
 
-    async def list_bots(self) -> List[BotInfoListResponse]:
+    def _find_bots(
+        self,
+        after: Optional[str],
+        headline_prefix: Optional[str],
+        limit: Optional[int]
+    ) -> AsyncIOMotorCursor:
+        try:
+            return self.crud.find_bots(after, headline_prefix, limit, LIST_PROJECTION)
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid after cursor")
+
+    @staticmethod
+    def _list_item(bot: Dict[str, Any]) -> BotInfoListResponse:
+        return BotInfoListResponse(
+            id=str(bot["_id"]),
+            headline=bot.get("headline", ""),
+            logo=bot.get("logo"),
+            created_at=bot.get("created_at", datetime.utcnow())
+        )
+
+    async def list_bots(
+        self,
+        after: Optional[str] = None,
+        headline_prefix: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[BotInfoListResponse]:
         """
-        Service function to list all bots with limited fields
+        Service function to list bots with limited fields, optionally one page
         """
+        cursor = self._find_bots(after, headline_prefix, limit)
         try:
-            bots = await self.crud.get_all_bots()
-            return [
-                BotInfoListResponse(
-                    id=str(bot["_id"]),
-                    headline=bot.get("headline", ""),
-                    logo=bot.get("logo"),
-                    created_at=bot.get("created_at", datetime.utcnow())
-                )
-                for bot in bots
-            ]
+            return [self._list_item(bot) for bot in await cursor.to_list(length=None)]
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error listing bots: {str(e)}") 
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=f"Error listing bots: {str(e)}")
+
+    async def stream_bots(
+        self,
+        after: Optional[str] = None,
+        headline_prefix: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        list_bots as NDJSON, serialized as documents arrive from the cursor
+        """
+        cursor = self._find_bots(after, headline_prefix, limit)
+        # Bad parameters fail above, before the response starts
+        return self._ndjson(cursor)
+
+    async def _ndjson(self, cursor: AsyncIOMotorCursor) -> AsyncIterator[bytes]:
+        try:
+            async for bot in cursor:
+                yield self._list_item(bot).model_dump_json().encode() + b"\n"
+        finally:
+            await cursor.close()
+
+    async def get_bot_info_body(self, bot_id: str) -> CachedBody:
+        """
+        Serialized get_bot_info response, cached until the bot changes
+        """
+        async def build() -> CachedBody:
+            return CachedBody.from_content(await self.get_bot_info(bot_id))
+
+        return await bot_info_cache.responses.get(bot_id, build)
+
+    async def list_bots_page(
+        self,
+        after: Optional[str] = None,
+        headline_prefix: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> BotListPage:
+        """
+        Serialized list_bots response, cached until any bot changes
+        """
+        async def build() -> BotListPage:
+            bots = await self.list_bots(after, headline_prefix, limit)
+            next_after = bots[-1].id if limit and len(bots) == limit else None
+            return BotListPage(CachedBody.from_content(bots), next_after)
+
+        key = bot_info_cache.responses.list_key(after, headline_prefix, limit)
+        return await bot_info_cache.responses.get(key, build)
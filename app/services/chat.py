@@ -1,125 +1,281 @@
+import asyncio
+import time
 import uuid
-from typing import AsyncGenerator, Tuple, Optional, List
+from contextlib import aclosing
+from typing import AsyncGenerator, Coroutine, Tuple, Optional, List, Union
 from fastapi import HTTPException
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.admission import AdmissionRejected, Ticket, admission
 from app.core.config import settings
-from openai import AsyncOpenAI
+from app.core.llm import LLMClient, LLMGateway, llm_client
 from app.core.logger import logger
-from app.core.constants import NO_BOT_DESCRIPTION, SYSTEM_MESSAGE_TEMPLATE, THIS_MESSAGE_WAS_DELETED
+from app.core.metrics import Counter
+from app.core.timing import Timings
+from app.core.constants import SUMMARY_PROMPT_TEMPLATE
 
-from app.crud.bot_info import BotInfoCRUD
+from app.crud.bot_cache import bot_info_cache, render_system_prompt
 from app.crud.chat import ChatCRUD
-from app.models.conversation import Message, MessageType, BotConversation
+from app.crud.response_cache import normalize_message, response_cache, response_key
+from app.crud.turn_writer import turn_writer
+from app.database.mongodb import history_database, stream_database
+from app.models.conversation import Message, MessageRecord, MessageType, BotConversation, ConversationRecord
 from app.schemas.chat import (
     MessageCreate, 
     MessageResponse, 
     StreamResponse, 
+    StreamError,
     CompletionResponse,
     ChatHistory,
     HistoryMessage,
     MessageEdit
 )
+from app.services.context import build_context, count_tokens, to_chat_message
+from app.services.streaming import StreamInterrupted, close_on, replay_deltas
+
+CHAT_INTERRUPTED = Counter(
+    "chat_interrupted_turns_total",
+    "Chat turns whose client disconnected before the reply was complete"
+)
+CHAT_INTERRUPTED_TOKENS = Counter(
+    "chat_interrupted_tokens_total",
+    "Completion tokens generated for chat turns before the client disconnected"
+)
+CHAT_TOKENS_SAVED = Counter(
+    "chat_interrupted_tokens_saved_total",
+    "Estimated completion tokens not generated because the upstream stream was closed on disconnect"
+)
+
+class ReplyLength:
+    """
+    Moving average of the completion tokens of finished replies, used to
+    estimate what the rest of an interrupted reply would have cost
+    """
+
+    def __init__(self, weight: float = 0.05):
+        self.weight = weight
+        self.mean: Optional[float] = None
+
+    def observe(self, tokens: int) -> None:
+        self.mean = tokens if self.mean is None else self.mean + (tokens - self.mean) * self.weight
+
+    def remaining(self, tokens: int) -> float:
+        return max(0.0, (self.mean or 0.0) - tokens)
+
+
+_reply_tokens = ReplyLength()
+
+def _record_interrupted(generated: int) -> None:
+    CHAT_INTERRUPTED.inc()
+    CHAT_INTERRUPTED_TOKENS.inc(generated)
+    CHAT_TOKENS_SAVED.inc(_reply_tokens.remaining(generated))
+
+def _spawn(coro: Coroutine) -> None:
+    # The writer keeps the task referenced and waits for it on shutdown
+    turn_writer.spawn(coro)
 
 class ChatService:
-    def __init__(self, db: AsyncIOMotorDatabase):
-        self.bot_info_curd = BotInfoCRUD(db)
-        self.crud = ChatCRUD(db)
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, db: AsyncIOMotorDatabase, llm: Optional[LLMClient] = None):
+        self.db = db
+        split_messages = settings.MESSAGE_STORAGE == "collection"
+        self.crud = ChatCRUD(db, split_messages=split_messages)
+        self.history_crud = ChatCRUD(history_database(db), split_messages=split_messages)
+        self.stream_crud = ChatCRUD(stream_database(db), split_messages=split_messages)
+        self.llm = llm or llm_client
+        self.gateway = LLMGateway(self.llm)
 
-    async def get_chat_history(self, chat_id: str, bot_id: str) -> ChatHistory:
-        conversation = await self.crud.get_chat_history(chat_id, bot_id)
-        if not conversation:
+    async def get_chat_history(
+        self,
+        chat_id: str,
+        bot_id: str,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        include_versions: bool = True,
+        include_deleted: bool = True
+    ) -> ChatHistory:
+        if before and after:
+            raise HTTPException(status_code=400, detail="Only one of before or after can be provided")
+
+        page = await self.history_crud.get_history_page(
+            chat_id,
+            bot_id,
+            before=before,
+            after=after,
+            limit=limit,
+            include_versions=include_versions,
+            include_deleted=include_deleted
+        )
+        if not page:
             raise HTTPException(status_code=404, detail="Conversation not found")
-            
+        if not page.cursor_found:
+            raise HTTPException(status_code=404, detail="Cursor message not found")
+
         return ChatHistory(
-            chat_id=conversation.chat_id,
-            bot_id=conversation.bot_id,
+            chat_id=page.chat_id,
+            bot_id=page.bot_id,
             messages=[
                 HistoryMessage(
-                    message_id=msg.message_id,
-                    type=msg.type,
-                    message=msg.message,
-                    versions=msg.versions,
-                    is_deleted=msg.is_deleted
-                ) for msg in conversation.messages
-            ]
+                    message_id=msg["message_id"],
+                    type=msg["type"],
+                    message=msg["message"],
+                    versions=msg.get("versions") if include_versions else None,
+                    is_deleted=msg.get("is_deleted", False),
+                    interrupted=msg.get("interrupted", False)
+                ) for msg in page.messages
+            ],
+            has_older=page.has_older,
+            has_newer=page.has_newer
         )
 
-    async def edit_message(self, edit_data: MessageEdit) -> ChatHistory:
-        # Get conversation
-        conversation = await self.crud.get_chat_history(edit_data.chat_id, edit_data.bot_id)
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-
-        # If updating message
-        if edit_data.updated_value is not None:
-            success = await self.crud.update_message(
-                edit_data.chat_id,
-                edit_data.message_id,
-                edit_data.updated_value
-            )
-        # If deleting message
-        elif edit_data.is_delete:
-            success = await self.crud.delete_message(
-                edit_data.chat_id,
-                edit_data.message_id
-            )
-        else:
+    async def edit_message(self, edit_data: MessageEdit) -> Union[ChatHistory, HistoryMessage]:
+        if edit_data.updated_value is None and not edit_data.is_delete:
             raise HTTPException(status_code=400, detail="Either updated_value or is_delete must be provided")
 
-        if not success:
+        # Edit and read back the result in one query; updated_value wins over is_delete
+        document = await self.crud.edit_message(
+            edit_data.chat_id,
+            edit_data.message_id,
+            edit_data.updated_value,
+            bot_id=edit_data.bot_id,
+            message_only=edit_data.message_only
+        )
+        if document is None:
+            if not await self.crud.conversation_exists(edit_data.chat_id, edit_data.bot_id):
+                raise HTTPException(status_code=404, detail="Conversation not found")
             raise HTTPException(status_code=404, detail="Message not found")
 
-        # Get updated conversation
-        updated_conversation = await self.crud.get_chat_history(edit_data.chat_id, edit_data.bot_id)
+        messages = [HistoryMessage(**msg) for msg in document["messages"]]
+        if edit_data.message_only:
+            return messages[0]
         return ChatHistory(
-            chat_id=updated_conversation.chat_id,
-            bot_id=updated_conversation.bot_id,
-            messages=[
-                HistoryMessage(
-                    message_id=msg.message_id,
-                    type=msg.type,
-                    message=msg.message,
-                    versions=msg.versions,
-                    is_deleted=msg.is_deleted
-                ) for msg in updated_conversation.messages
-            ]
+            chat_id=document["chat_id"],
+            bot_id=document["bot_id"],
+            messages=messages
+        )
+
+    async def call_openai(
+        self,
+        conversation: Union[BotConversation, ConversationRecord],
+        user_message: str,
+        timings: Optional[Timings] = None,
+        ticket: Optional[Ticket] = None
+    ) -> AsyncGenerator:
+        timings = timings or Timings(histogram=None)
+        with timings.span("bot_lookup"):
+            bot = await bot_info_cache.get(self.db, conversation.bot_id)
+        bot_info = bot.bot_info if bot else {}
+        with timings.span("prompt_assembly"):
+            context = build_context(
+                system_message=bot.system_prompt if bot else render_system_prompt(bot_info),
+                history=conversation.messages,
+                user_message=user_message,
+                budget=bot_info.get("context_token_budget") or settings.CONTEXT_TOKEN_BUDGET,
+                summary=conversation.summary
+            )
+        if ticket is not None:
+            ticket.charge(context.prompt_tokens)
+        if settings.CONTEXT_SUMMARY_ENABLED:
+            self._schedule_summary(conversation, context.dropped)
+
+        return self.gateway.stream_chat_completion(
+            bot_info.get("llm_endpoints") or settings.LLM_DEFAULT_ENDPOINTS,
+            messages=context.messages
         )
 
-    def _build_message_history(self, conversation: BotConversation) -> List[dict]:
-        messages = []
-        for msg in conversation.messages:
-            if msg.is_deleted:
-                messages.append({"role": msg.type, "content": THIS_MESSAGE_WAS_DELETED})
-            role = "assistant" if msg.type == MessageType.ASSISTANT else "user"
-            messages.append({"role": role, "content": msg.message})
-        return messages
-    
-    async def create_system_message(self, bot_id: str) -> str:
-        bot_info = await self.bot_info_curd.get_bot_by_id(bot_id=bot_id)
-        return SYSTEM_MESSAGE_TEMPLATE.format(bot_description=bot_info.get("secondary_description", NO_BOT_DESCRIPTION))
-
-    async def call_openai(self, conversation: BotConversation, user_message: str) -> AsyncGenerator:
-        messages = []
-        messages.append({
-            "role": "system", 
-            "content": await self.create_system_message(conversation.bot_id)
-        })
-        messages.extend(self._build_message_history(conversation))
-        messages.append({"role": "user", "content": user_message})
-        return await self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            stream=True
+    async def _first_turn_reply(
+        self,
+        conversation: Union[BotConversation, ConversationRecord],
+        user_message: str
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Stored reply to the first turn of a conversation, from the bot's
+        precomputed starter answers or the response cache, and the response
+        cache key a new reply should be stored under
+        """
+        bot = await bot_info_cache.get(self.db, conversation.bot_id)
+        if bot is None:
+            return None, None
+        reply = bot.starter_replies.get(normalize_message(user_message))
+        if reply is not None or not settings.RESPONSE_CACHE_ENABLED:
+            return reply, None
+        endpoints = bot.bot_info.get("llm_endpoints") or settings.LLM_DEFAULT_ENDPOINTS
+        key = response_key(conversation.bot_id, bot.system_prompt, endpoints, user_message)
+        return await response_cache.get(self.db, key), key
+
+    def _schedule_summary(
+        self,
+        conversation: Union[BotConversation, ConversationRecord],
+        dropped: List[MessageRecord]
+    ) -> None:
+        """
+        Fold turns that fell out of the context window into the conversation
+        summary in the background, so the summary is extended incrementally
+        instead of being recomputed on every turn
+        """
+        history_ids = [msg.message_id for msg in conversation.messages]
+        if conversation.summary_until in history_ids:
+            dropped = dropped[history_ids.index(conversation.summary_until) + 1:]
+        if not dropped:
+            return
+
+        _spawn(self._update_summary(conversation, dropped))
+
+    async def _update_summary(
+        self,
+        conversation: Union[BotConversation, ConversationRecord],
+        dropped: List[MessageRecord]
+    ) -> None:
+        transcript = "\n".join(
+            f"{message['role']}: {message['content']}" for message in map(to_chat_message, dropped)
         )
+        prompt = SUMMARY_PROMPT_TEMPLATE.format(
+            summary=conversation.summary or "(none)",
+            messages=transcript
+        )
+        try:
+            async with admission.admit(conversation.bot_id) as ticket:
+                summary = await self.llm.chat_completion(
+                    model=settings.OPENAI_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS
+                )
+                ticket.charge(count_tokens(prompt) + count_tokens(summary))
+            await self.stream_crud.update_summary(
+                conversation.chat_id,
+                summary,
+                dropped[-1].message_id,
+                conversation.summary_until
+            )
+        except Exception as e:
+            logger.error(f"Error updating conversation summary: {e}")
+
+    async def _save_turn(
+        self,
+        chat_id: str,
+        messages: List[Message],
+        new_conversation: Optional[BotConversation] = None
+    ) -> bool:
+        """
+        Store a turn's messages together in a single database call
+        """
+        if turn_writer.running:
+            await turn_writer.submit(chat_id, messages, new_conversation)
+            return True
+        return await self.stream_crud.add_messages(chat_id, messages, new_conversation)
 
     async def process_message(
         self,
         message_data: MessageCreate,
+        disconnected: Optional[asyncio.Event] = None,
+        assistant_message_id: Optional[str] = None
     ) -> AsyncGenerator[Tuple[str, dict], None]:
+        """
+        Run a chat turn, yielding stream events. Once `disconnected` is set the
+        upstream stream is closed and the partial reply stored as interrupted.
+        """
         # Generate message IDs
         user_message_id = str(uuid.uuid4())
-        assistant_message_id = str(uuid.uuid4())
+        assistant_message_id = assistant_message_id or str(uuid.uuid4())
 
         # Create user message
         user_message = Message(
@@ -136,15 +292,22 @@ class ChatService:
             message=""
         )
 
-        # Get or create conversation
-        conversation = await self.crud.get_conversation(message_data.chat_id)
+        timings = Timings()
+
+        # Get conversation
+        with timings.span("conversation_load"):
+            conversation = await self.crud.get_recent_conversation(
+                message_data.chat_id,
+                last_n=settings.CHAT_HISTORY_MAX_MESSAGES
+            )
+        # A new conversation is created by the upsert that stores its first turn
+        new_conversation = None
         if not conversation:
-            conversation = BotConversation(
+            conversation = new_conversation = BotConversation(
                 chat_id=message_data.chat_id,
                 bot_id=message_data.bot_id,
                 messages=[]
             )
-            await self.crud.create_conversation(conversation)
 
         # Send user message confirmation
         user_response = MessageResponse(
@@ -156,39 +319,112 @@ class ChatService:
 
         # Stream the chat completion
         buffer = ""
-        try:
-            stream = await self.call_openai(conversation, message_data.message)
-            
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    delta = chunk.choices[0].delta.content
-                    buffer += delta
-                    stream_response = StreamResponse(
-                        message_id=assistant_message_id,
-                        delta=delta,
-                        buffer=buffer
-                    )
-                    yield "assistant_message", stream_response.dict()
+        first_token_at = None
+        failed = interrupted = False
+        generated = 0
+        cached_reply = cache_key = None
+        # Only a turn without history can reuse a stored reply
+        stored_replies = settings.RESPONSE_CACHE_ENABLED or settings.STARTER_ANSWERS_PRECOMPUTE
+        if stored_replies and not conversation.messages and not conversation.summary:
+            with timings.span("response_cache"):
+                try:
+                    cached_reply, cache_key = await self._first_turn_reply(conversation, message_data.message)
+                except Exception as e:
+                    # The model call below reports a lasting problem with the bot
+                    logger.warning(f"Stored reply lookup for bot {message_data.bot_id} failed: {e}")
 
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            
-            # If an error occurs, yield an assistant message with a failure notice
-            error_message = "AI call failed"
-            stream_response = StreamResponse(
-                message_id=assistant_message_id,
-                delta=error_message,
-                buffer=buffer + error_message
-            )
-            yield "assistant_message", stream_response.dict()
+        if cached_reply is not None:
+            # Replayed without going through admission control or the model
+            buffer = cached_reply
+            for delta in replay_deltas(cached_reply):
+                stream_response = StreamResponse(
+                    message_id=assistant_message_id,
+                    delta=delta
+                )
+                yield "assistant_message", stream_response.dict(exclude_none=True)
+        else:
+            try:
+                async with admission.admit(message_data.bot_id) as ticket:
+                    timings.record("admission", ticket.waited)
+                    stream = await self.call_openai(conversation, message_data.message, timings, ticket)
+                    if disconnected is not None:
+                        stream = close_on(stream, disconnected)
+                    requested_at = time.perf_counter()
+
+                    try:
+                        async with aclosing(stream):
+                            async for chunk in stream:
+                                if chunk.choices[0].delta.content:
+                                    if first_token_at is None:
+                                        first_token_at = time.perf_counter()
+                                        timings.record("llm_first_token", first_token_at - requested_at)
+                                    delta = chunk.choices[0].delta.content
+                                    buffer += delta
+                                    generated += 1
+                                    ticket.charge(1)
+                                    stream_response = StreamResponse(
+                                        message_id=assistant_message_id,
+                                        delta=delta
+                                    )
+                                    yield "assistant_message", stream_response.dict(exclude_none=True)
+                    except (asyncio.CancelledError, GeneratorExit):
+                        # The response was torn down with the connection before
+                        # the watcher noticed; keep the partial reply anyway
+                        assistant_message.message = buffer
+                        assistant_message.interrupted = True
+                        _record_interrupted(generated)
+                        _spawn(self._save_turn(message_data.chat_id, [user_message, assistant_message], new_conversation))
+                        raise
+
+            except StreamInterrupted:
+                interrupted = True
+
+            except AdmissionRejected as e:
+                # Shed before the model was called; nothing of this turn is stored
+                logger.warning(f"Chat turn for bot {message_data.bot_id} shed: {e.reason}")
+                error = StreamError(message_id=assistant_message_id, error=e.reason, retry_after=e.retry_after)
+                yield "error", error.dict(exclude_none=True)
+                return
+
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                failed = True
             
+                # If an error occurs, yield an assistant message with a failure notice
+                error_message = "AI call failed"
+                stream_response = StreamResponse(
+                    message_id=assistant_message_id,
+                    delta=error_message
+                )
+                yield "assistant_message", stream_response.dict(exclude_none=True)
+
+        if first_token_at is not None:
+            timings.record("llm_streaming", time.perf_counter() - first_token_at)
+
         # Update assistant message with complete response
         assistant_message.message = buffer
+        if interrupted:
+            # The client is gone; store what was generated and stop. The write
+            # must not be lost if the response is torn down meanwhile.
+            assistant_message.interrupted = True
+            _record_interrupted(generated)
+            _spawn(self._save_turn(message_data.chat_id, [user_message, assistant_message], new_conversation))
+            return
+        if cached_reply is None and not failed:
+            _reply_tokens.observe(generated)
+        if cache_key is not None and cached_reply is None and buffer and not failed:
+            _spawn(response_cache.set(self.db, cache_key, message_data.bot_id, message_data.message, buffer))
 
         # Save both messages together in a single database call
-        if not await self.crud.add_messages(message_data.chat_id, [user_message, assistant_message]):
+        with timings.span("persist"):
+            saved = await self._save_turn(message_data.chat_id, [user_message, assistant_message], new_conversation)
+        if not saved:
             raise HTTPException(status_code=500, detail="Failed to save messages")
 
         # Send completion confirmation
-        completion = CompletionResponse(message_id=assistant_message_id)
-        yield "done", completion.dict()
\ No newline at end of file
+        completion = CompletionResponse(
+            message_id=assistant_message_id,
+            cached=True if cached_reply is not None else None,
+            server_timing=timings.server_timing() if settings.CHAT_SERVER_TIMING else None
+        )
+        yield "done", completion.dict(exclude_none=True)
\ No newline at end of file
@@ -0,0 +1,85 @@
+import importlib.util
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence
+
+from app.core.constants import CONVERSATION_SUMMARY_PREFIX, THIS_MESSAGE_WAS_DELETED
+from app.models.conversation import MessageType
+
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_TOKEN_OVERHEAD = 4
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken when it is installed, otherwise approximate
+    from the text length
+    """
+    global _encoding
+    if _encoding is None:
+        if importlib.util.find_spec("tiktoken") is not None:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        else:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_TOKEN_OVERHEAD
+
+
+def to_chat_message(msg: Any) -> dict:
+    role = "assistant" if msg.type == MessageType.ASSISTANT else "user"
+    content = THIS_MESSAGE_WAS_DELETED if msg.is_deleted else msg.message
+    return {"role": role, "content": content}
+
+
+@dataclass
+class Context:
+    messages: List[dict]
+    prompt_tokens: int
+    # Stored messages that did not fit in the budget, oldest first
+    dropped: List[Any] = field(default_factory=list)
+
+
+def build_context(
+    system_message: str,
+    history: Sequence[Any],
+    user_message: str,
+    budget: int,
+    summary: Optional[str] = None
+) -> Context:
+    """
+    Assemble the prompt for a chat turn within `budget` tokens.
+
+    The system message and the new user message are always sent. The most
+    recent history is added newest first until the budget is used up, and
+    the rolling summary of older turns (if any) takes priority over history.
+    """
+    head = [{"role": "system", "content": system_message}]
+    if summary:
+        head.append({"role": "system", "content": f"{CONVERSATION_SUMMARY_PREFIX}\n{summary}"})
+    tail = [{"role": "user", "content": user_message}]
+    used = sum(message_tokens(message) for message in head + tail)
+
+    kept: List[dict] = []
+    cutoff = len(history)
+    for index in range(len(history) - 1, -1, -1):
+        message = to_chat_message(history[index])
+        tokens = message_tokens(message)
+        if used + tokens > budget:
+            break
+        kept.append(message)
+        used += tokens
+        cutoff = index
+
+    kept.reverse()
+    return Context(
+        messages=head + kept + tail,
+        prompt_tokens=used,
+        dropped=list(history[:cutoff])
+    )
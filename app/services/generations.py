@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, NamedTuple, Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import Gauge
+from app.schemas.chat import StreamCheckpoint, StreamMode
+from app.services.streaming import Event, StreamEncoder
+
+# How long a new turn waits for its first client, even with no grace period
+FIRST_CLIENT_SECONDS = 1.0
+
+
+class Frame(NamedTuple):
+    seq: int
+    event: str
+    # The payload without its `buffer`, which would copy the reply so far
+    data: dict
+    # Length of the reply text before the service event this frame encodes
+    offset: int
+    # Length of the `buffer` the payload carried, if any
+    buffer_end: Optional[int] = None
+
+
+def parse_event_id(value: str) -> Optional[Tuple[str, int]]:
+    """
+    Assistant message_id and sequence number of an SSE event id
+    """
+    message_id, _, seq = value.strip().rpartition(":")
+    if not message_id or not seq.isdigit():
+        return None
+    return message_id, int(seq)
+
+
+class Generation:
+    """
+    The SSE frames of one chat turn, kept so a client that reconnects can
+    resume the reply instead of asking for it again.
+
+    Frames are numbered from 1 and the last `max_events` are kept in a ring
+    buffer. The turn keeps running while no client is attached, for up to
+    `grace` seconds, after which `abandoned` is set so the upstream stream
+    is closed.
+    """
+
+    def __init__(
+        self,
+        message_id: str,
+        chat_id: str,
+        bot_id: str,
+        encoder: StreamEncoder,
+        max_events: int,
+        grace: float
+    ):
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.bot_id = bot_id
+        self.encoder = encoder
+        self.grace = grace
+        self.frames: Deque[Frame] = deque(maxlen=max_events)
+        self.seq = 0
+        self.done = False
+        self.subscribers = 0
+        self.abandoned = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._grace_timer: Optional[asyncio.TimerHandle] = None
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.message_id}:{seq}"
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, event_type: str, data: dict) -> None:
+        offset = len(self.encoder.buffer)
+        for encoded_type, payload in self.encoder.encode(event_type, data):
+            self.seq += 1
+            buffer_end = None
+            if "buffer" in payload:
+                payload = dict(payload)
+                buffer_end = len(payload.pop("buffer"))
+            self.frames.append(Frame(self.seq, encoded_type, payload, offset, buffer_end))
+        self._notify()
+
+    def _payload(self, frame: Frame) -> dict:
+        if frame.buffer_end is None:
+            return frame.data
+        # The reply only grows, so its prefix is the buffer the frame was sent with
+        return {**frame.data, "buffer": self.encoder.buffer[:frame.buffer_end]}
+
+    def finish(self) -> None:
+        self.done = True
+        if self._grace_timer is not None:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+        self._notify()
+
+    def attach(self) -> None:
+        self.subscribers += 1
+        if self._grace_timer is not None:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+
+    def detach(self) -> None:
+        self.subscribers -= 1
+        self.start_grace()
+
+    def start_grace(self, grace: Optional[float] = None) -> None:
+        """
+        Abandon the turn after `grace` seconds (by default the generation's
+        grace period) unless a client attaches first
+        """
+        if self.subscribers or self.done or self._grace_timer is not None:
+            return
+        grace = self.grace if grace is None else grace
+        if grace > 0:
+            self._grace_timer = asyncio.get_running_loop().call_later(grace, self.abandoned.set)
+        else:
+            self.abandoned.set()
+
+    async def follow(self, after: int = 0) -> AsyncIterator[Tuple[str, str, dict]]:
+        """
+        `(id, event, data)` of the frames after sequence number `after`, then
+        of new frames as they are published, until the turn ends. When some
+        of the requested frames were already dropped from the buffer, a delta
+        stream gets a checkpoint with the reply text up to the oldest one left.
+        """
+        after = min(after, self.seq)
+        while True:
+            if self.frames and after < self.frames[0].seq - 1:
+                first = self.frames[0]
+                if self.encoder.mode == StreamMode.DELTA:
+                    checkpoint = StreamCheckpoint(
+                        message_id=self.message_id,
+                        offset=first.offset,
+                        buffer=self.encoder.buffer[:first.offset]
+                    )
+                    yield self.event_id(first.seq - 1), "checkpoint", checkpoint.dict()
+                after = first.seq - 1
+
+            # Copied, as the buffer may change while a frame is being sent
+            pending = list(itertools.islice(self.frames, len(self.frames) - (self.seq - after), None))
+            for frame in pending:
+                yield self.event_id(frame.seq), frame.event, self._payload(frame)
+                after = frame.seq
+
+            if after < self.seq:
+                continue
+            if self.done:
+                return
+            await self._changed.wait()
+
+
+class GenerationRegistry:
+    """
+    Chat turns that can be resumed by their assistant message_id: running
+    ones, and finished ones for `ttl` seconds
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.live: Dict[str, Generation] = {}
+        self.finished = TTLCache("sse_generations", max_size, ttl)
+        self._tasks = set()
+
+    def get(self, message_id: str) -> Optional[Generation]:
+        return self.live.get(message_id) or self.finished.get(message_id)
+
+    def start(self, generation: Generation, events: AsyncIterator[Event]) -> None:
+        """
+        Publish the turn's service events to `generation` in the background,
+        independently of the connections following it
+        """
+        self.live[generation.message_id] = generation
+        # Covers a response that is never sent, so no client ever attaches
+        generation.start_grace(max(generation.grace, FIRST_CLIENT_SECONDS))
+        task = asyncio.create_task(self._produce(generation, events))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _produce(self, generation: Generation, events: AsyncIterator[Event]) -> None:
+        try:
+            async for event_type, data in events:
+                generation.publish(event_type, data)
+        except Exception as e:
+            logger.error(f"Chat turn {generation.message_id} failed: {e}")
+        finally:
+            # Closing unwinds the turn, which stops the upstream stream
+            await events.aclose()
+            generation.finish()
+            del self.live[generation.message_id]
+            if self.finished.ttl > 0:
+                self.finished.set(generation.message_id, generation)
+
+
+generations = GenerationRegistry(settings.SSE_RESUME_TTL_SECONDS, settings.SSE_RESUME_MAX_GENERATIONS)
+
+SSE_LIVE_GENERATIONS = Gauge(
+    "chat_sse_live_generations",
+    "Chat turns currently generating, whether or not a client is attached",
+    function=lambda: {(): len(generations.live)}
+)
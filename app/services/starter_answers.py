@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.admission import admission
+from app.core.config import settings
+from app.core.llm import LLMClient, LLMGateway, llm_client
+from app.core.logger import logger
+from app.crud.bot_cache import action_items, bot_info_cache, render_system_prompt, starter_content_hash
+from app.crud.bot_info import BotInfoCRUD
+from app.services.context import build_context
+
+# Keeps running jobs referenced until they finish
+_jobs = set()
+
+
+async def precompute_starter_answers(
+    db: AsyncIOMotorDatabase,
+    bot_id: str,
+    llm: Optional[LLMClient] = None
+) -> bool:
+    """
+    Generate and store the reply to each of the bot's action items, with the
+    same prompt a new chat starting with that item would send. Returns
+    whether the stored answers match the bot's current content.
+    """
+    crud = BotInfoCRUD(db)
+    bot_info = await crud.get_bot_by_id(bot_id)
+    if bot_info is None:
+        return False
+    content_hash = starter_content_hash(bot_info)
+    if (bot_info.get("starter_answers") or {}).get("content_hash") == content_hash:
+        return True
+
+    gateway = LLMGateway(llm or llm_client)
+    endpoints = bot_info.get("llm_endpoints") or settings.LLM_DEFAULT_ENDPOINTS
+    answers = []
+    for item in dict.fromkeys(action_items(bot_info)):
+        context = build_context(
+            system_message=render_system_prompt(bot_info),
+            history=[],
+            user_message=item,
+            budget=bot_info.get("context_token_budget") or settings.CONTEXT_TOKEN_BUDGET
+        )
+        async with admission.admit(bot_id) as ticket:
+            ticket.charge(context.prompt_tokens)
+            parts = []
+            async for chunk in gateway.stream_chat_completion(endpoints, messages=context.messages):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    ticket.charge(1)
+        answers.append({"item": item, "reply": "".join(parts)})
+
+    stored = await crud.set_starter_answers(
+        bot_id,
+        bot_info.get("version"),
+        {"content_hash": content_hash, "answers": answers, "created_at": datetime.utcnow()}
+    )
+    if stored:
+        bot_info_cache.invalidate(bot_id)
+    else:
+        logger.info(f"Bot {bot_id} changed while its starter answers were generated; discarded")
+    return stored
+
+
+async def _run(db: AsyncIOMotorDatabase, bot_id: str) -> None:
+    try:
+        await precompute_starter_answers(db, bot_id)
+    except Exception as e:
+        logger.error(f"Precomputing starter answers for bot {bot_id} failed: {e}")
+
+
+def schedule_starter_answers(db: AsyncIOMotorDatabase, bot_id: str) -> None:
+    """
+    Precompute the bot's starter answers in the background, if enabled.
+    Nothing is generated when the stored answers are still current.
+    """
+    if not settings.STARTER_ANSWERS_PRECOMPUTE:
+        return
+    task = asyncio.create_task(_run(db, bot_id))
+    _jobs.add(task)
+    task.add_done_callback(_jobs.discard)
@@ -0,0 +1,244 @@
+import asyncio
+import math
+import re
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, AsyncIterator, List, Optional, Tuple
+
+from app.schemas.chat import PacingPolicy, StreamMode, StreamResponse, StreamCheckpoint
+
+Event = Tuple[str, dict]
+
+_END = object()
+
+
+def negotiate_stream_mode(
+    requested: Optional[StreamMode],
+    accept: Optional[str],
+    default: StreamMode = StreamMode.FULL
+) -> StreamMode:
+    """
+    Pick the stream mode from the `stream_mode` query parameter, falling back
+    to a `mode=` parameter on the Accept header (`text/event-stream; mode=delta`)
+    """
+    if requested is not None:
+        return requested
+    for media_range in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        if media_type != "text/event-stream":
+            continue
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "mode":
+                try:
+                    return StreamMode(value.strip().strip('"').lower())
+                except ValueError:
+                    pass
+    return default
+
+
+def replay_deltas(reply: str) -> List[str]:
+    """
+    Split a stored reply into word-sized deltas, the way it was streamed
+    """
+    parts = re.findall(r"\s*\S+", reply)
+    tail = reply[len("".join(parts)):]
+    if tail:
+        parts.append(tail)
+    return parts
+
+
+class StreamInterrupted(Exception):
+    """
+    The consumer of a stream went away before it ended
+    """
+
+
+async def close_on(items: AsyncGenerator[Any, None], stop: asyncio.Event) -> AsyncIterator[Any]:
+    """
+    Yield from `items` until `stop` is set. The source is closed right away,
+    even while it is waiting for its next item, and StreamInterrupted raised.
+    """
+    stopped = asyncio.create_task(stop.wait())
+    item = None
+    try:
+        while True:
+            item = asyncio.ensure_future(items.__anext__())
+            await asyncio.wait((item, stopped), return_when=asyncio.FIRST_COMPLETED)
+            if not item.done():
+                raise StreamInterrupted()
+            try:
+                value = item.result()
+            except StopAsyncIteration:
+                return
+            yield value
+    finally:
+        stopped.cancel()
+        if item is not None and not item.done():
+            # Cancelling the pending read unwinds the source, which closes it
+            item.cancel()
+            await asyncio.gather(item, return_exceptions=True)
+        else:
+            await items.aclose()
+
+class StreamEncoder:
+    """
+    Turns service events into SSE payloads for the negotiated stream mode.
+
+    `full` keeps the legacy protocol where every frame carries the whole
+    accumulated buffer. `delta` sends only the new text, a checkpoint with the
+    buffer every `checkpoint_interval` frames and the full message on `done`.
+    """
+
+    def __init__(self, mode: StreamMode, checkpoint_interval: int = 0):
+        self.mode = mode
+        self.checkpoint_interval = checkpoint_interval
+        self.buffer = ""
+        self.frames = 0
+
+    def encode(self, event_type: str, data: dict) -> List[Event]:
+        if event_type == "assistant_message":
+            self.buffer += data["delta"]
+            self.frames += 1
+            if self.mode == StreamMode.FULL:
+                return [(event_type, {**data, "buffer": self.buffer})]
+
+            events = [(event_type, data)]
+            if self.checkpoint_interval and self.frames % self.checkpoint_interval == 0:
+                checkpoint = StreamCheckpoint(
+                    message_id=data["message_id"],
+                    offset=len(self.buffer),
+                    buffer=self.buffer
+                )
+                events.append(("checkpoint", checkpoint.dict()))
+            return events
+
+        if event_type == "done" and self.mode == StreamMode.DELTA:
+            return [(event_type, {**data, "message": self.buffer})]
+        return [(event_type, data)]
+
+
+async def coalesce_deltas(
+    events: AsyncIterator[Event],
+    max_chars: int = 0,
+    window: float = 0.0,
+    min_interval: float = 0.0,
+    adaptive: bool = False
+) -> AsyncIterator[Event]:
+    """
+    Merge consecutive `assistant_message` deltas into larger frames.
+
+    A frame is flushed once it holds `max_chars` characters or `window`
+    seconds after its first delta arrived. `min_interval` spaces frames out
+    to a fixed rate, and `adaptive` flushes as soon as no more deltas are
+    already waiting, so tokens are only batched while the client is slower
+    than the model. Any other event flushes the pending frame before it is
+    passed through.
+    """
+    if not (max_chars or window or min_interval or adaptive):
+        async with aclosing(events):
+            async for event in events:
+                yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+            await queue.put(_END)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(pump())
+    message_id = None
+    parts: List[str] = []
+    size = 0
+    deadline = None
+    last_flush = -math.inf
+
+    def start_frame(data: dict):
+        nonlocal message_id, parts, size, deadline
+        now = loop.time()
+        message_id, parts, size = data["message_id"], [], 0
+        deadline = now + window if window else None
+        if min_interval:
+            deadline = max(deadline or now, last_flush + min_interval)
+        if adaptive and deadline is None:
+            deadline = now
+
+    def flush() -> Event:
+        nonlocal message_id, parts, size, deadline, last_flush
+        frame = StreamResponse(message_id=message_id, delta="".join(parts))
+        message_id, parts, size, deadline = None, [], 0, None
+        last_flush = loop.time()
+        return "assistant_message", frame.dict(exclude_none=True)
+
+    try:
+        while True:
+            if deadline is None:
+                item = await queue.get()
+            else:
+                try:
+                    # Whatever has already arrived joins the pending frame
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        yield flush()
+                        continue
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        yield flush()
+                        continue
+
+            if item is _END or isinstance(item, Exception):
+                if parts:
+                    yield flush()
+                if item is _END:
+                    break
+                raise item
+
+            event_type, data = item
+            if event_type != "assistant_message":
+                if parts:
+                    yield flush()
+                yield item
+                continue
+
+            if parts and message_id != data["message_id"]:
+                yield flush()
+            if not parts:
+                start_frame(data)
+            parts.append(data["delta"])
+            size += len(data["delta"])
+            if max_chars and size >= max_chars:
+                yield flush()
+    finally:
+        task.cancel()
+
+
+def pace_deltas(
+    events: AsyncIterator[Event],
+    policy: PacingPolicy = PacingPolicy.NONE,
+    frame_rate: float = 0.0,
+    max_chars: int = 0,
+    window: float = 0.0
+) -> AsyncIterator[Event]:
+    """
+    Apply the server-side pacing policy to a stream of service events.
+
+    `none` forwards deltas as they arrive (only the explicit size/window
+    coalescing applies), `fixed` emits at most `frame_rate` frames per second
+    and `adaptive` batches whatever tokens arrived while the previous frame
+    was being sent. None of the policies delays the first token.
+    """
+    return coalesce_deltas(
+        events,
+        max_chars=max_chars,
+        window=window,
+        min_interval=1 / frame_rate if policy == PacingPolicy.FIXED and frame_rate > 0 else 0.0,
+        adaptive=policy == PacingPolicy.ADAPTIVE
+    )
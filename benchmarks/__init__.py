@@ -0,0 +1,3 @@
+"""
+Benchmarks and load tests for the chatbot backend
+"""
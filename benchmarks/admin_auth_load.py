@@ -0,0 +1,86 @@
+"""
+SSE frame latency while admin requests are being authenticated.
+
+A simulated SSE stream sends a frame every `--frame-interval` ms and records
+how late each frame is, while `--admin-clients` loops authenticate admin
+calls back to back, either with bcrypt on the event loop (the previous
+behaviour), with bcrypt offloaded to the hashing pool, or with the signed
+admin token issued after the first successful check.
+
+    python -m benchmarks.admin_auth_load --duration 5 --admin-clients 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.core.auth import (
+    create_admin_token,
+    get_password_hash,
+    verify_admin_token,
+    verify_password,
+    verify_password_async,
+)
+
+BOT_ID = "65f1c0c1e8f5e4a4f9a510c0"
+PASSWORD = "12345678"
+
+
+async def sse_stream(stop: asyncio.Event, interval: float, lateness: list):
+    loop = asyncio.get_running_loop()
+    expected = loop.time() + interval
+    while not stop.is_set():
+        await asyncio.sleep(max(expected - loop.time(), 0))
+        lateness.append(max(loop.time() - expected, 0))
+        expected += interval
+
+
+async def admin_client(stop: asyncio.Event, mode: str, hashed: str, counter: list):
+    token = create_admin_token(BOT_ID, hashed)
+    while not stop.is_set():
+        if mode == "inline":
+            verify_password(PASSWORD, hashed)
+        elif mode == "offload":
+            await verify_password_async(PASSWORD, hashed)
+        else:
+            verify_admin_token(token, BOT_ID, hashed)
+        counter[0] += 1
+        await asyncio.sleep(0)
+
+
+async def run(mode: str, duration: float, clients: int, interval: float, hashed: str):
+    stop = asyncio.Event()
+    lateness, counter = [], [0]
+    tasks = [asyncio.create_task(sse_stream(stop, interval, lateness))]
+    if mode != "idle":
+        tasks += [asyncio.create_task(admin_client(stop, mode, hashed, counter)) for _ in range(clients)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    lateness.sort()
+    print(
+        f"{mode:8s} admin_auths/s={counter[0] / duration:8.0f} frames={len(lateness):<5d} "
+        f"frame_delay p50={statistics.median(lateness) * 1000:6.1f}ms "
+        f"p99={lateness[int(len(lateness) * 0.99) - 1] * 1000:7.1f}ms "
+        f"max={lateness[-1] * 1000:7.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--admin-clients", type=int, default=8)
+    parser.add_argument("--frame-interval", type=float, default=20.0)
+    args = parser.parse_args()
+
+    hashed = get_password_hash(PASSWORD)
+    for mode in ("idle", "inline", "offload", "token"):
+        asyncio.run(run(mode, args.duration, args.admin_clients, args.frame_interval / 1000, hashed))
+
+
+if __name__ == "__main__":
+    main()
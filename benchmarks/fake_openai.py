@@ -0,0 +1,160 @@
+"""
+Minimal OpenAI-compatible HTTP server used by benchmarks and tests.
+
+Serves streamed `/v1/chat/completions` over plain HTTP/1.1 keep-alive and
+counts accepted TCP connections so connection reuse can be observed.
+"""
+import asyncio
+import json
+import time
+from typing import Callable, Optional, Union
+
+Delay = Union[float, Callable[[int], float]]
+Status = Union[int, Callable[[int], int]]
+
+
+class FakeOpenAIServer:
+    def __init__(
+        self,
+        tokens: int = 20,
+        token_delay: float = 0.0,
+        first_token_delay: Delay = 0.0,
+        status: Status = 200,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.status = status
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.requests = 0
+        self.cancelled = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: set = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for handler in list(self._handlers):
+                handler.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def __aenter__(self) -> "FakeOpenAIServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _first_token_delay(self, request_number: int) -> float:
+        if callable(self.first_token_delay):
+            return self.first_token_delay(request_number)
+        return self.first_token_delay
+
+    def _status(self, request_number: int) -> int:
+        if callable(self.status):
+            return self.status(request_number)
+        return self.status
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                await self._respond(writer, json.loads(body or b"{}"), self.requests)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.cancelled += 1
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._handlers.discard(handler)
+            writer.close()
+
+    def _chunk(self, model: str, delta: dict, finish_reason: Optional[str] = None) -> bytes:
+        payload = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        data = f"data: {json.dumps(payload)}\n\n".encode()
+        return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+    async def _respond(self, writer: asyncio.StreamWriter, body: dict, request_number: int):
+        model = body.get("model", "fake-model")
+        status = self._status(request_number)
+        if status != 200:
+            payload = json.dumps({"error": {"message": "injected failure", "type": "server_error"}}).encode()
+            writer.write(
+                f"HTTP/1.1 {status} Error\r\nContent-Type: application/json\r\n".encode()
+                + f"Content-Length: {len(payload)}\r\n\r\n".encode()
+                + payload
+            )
+            await writer.drain()
+            return
+
+        words = [f"tok{i} " for i in range(self.tokens)]
+
+        if not body.get("stream"):
+            payload = json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 1, "completion_tokens": self.tokens, "total_tokens": self.tokens + 1},
+            }).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(payload)}\r\n\r\n".encode()
+                + payload
+            )
+            await writer.drain()
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        await writer.drain()
+        await asyncio.sleep(self._first_token_delay(request_number))
+        for i, word in enumerate(words):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            writer.write(self._chunk(model, {"content": word}))
+            await writer.drain()
+        writer.write(self._chunk(model, {}, "stop"))
+        done = b"data: [DONE]\n\n"
+        writer.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+        await writer.drain()
@@ -0,0 +1,106 @@
+"""
+Deserialization time and memory of a full conversation load versus the
+projected read used by chat turns, for conversations of various lengths.
+
+BSON encode/decode stands in for the wire so the numbers include decoding
+cost without needing a MongoDB server.
+
+    python -m benchmarks.history_reads --sizes 10 1000 10000 --last-n 50
+"""
+import argparse
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import bson
+
+from app.models.conversation import BotConversation, ConversationRecord, MessageRecord
+
+
+def make_document(size: int) -> dict:
+    now = datetime.utcnow()
+    messages = []
+    for i in range(size):
+        text = f"Message {i} " + "lorem ipsum dolor sit amet " * 8
+        messages.append({
+            "id": None,
+            "created_at": now,
+            "updated_at": now,
+            "message_id": str(uuid.uuid4()),
+            "type": "user" if i % 2 == 0 else "assistant",
+            "message": text,
+            "versions": [text, text + " (edited)"] if i % 5 == 0 else [text],
+            "is_deleted": i % 17 == 0,
+        })
+    return {
+        "_id": bson.ObjectId(),
+        "chat_id": "chat",
+        "bot_id": "bot",
+        "created_at": now,
+        "updated_at": now,
+        "messages": messages,
+    }
+
+
+def projected(document: dict, last_n: int) -> dict:
+    # What the $slice/$map aggregation in ChatCRUD.get_recent_conversation returns
+    return {
+        "chat_id": document["chat_id"],
+        "bot_id": document["bot_id"],
+        "messages": [
+            {key: msg[key] for key in ("message_id", "type", "message", "is_deleted")}
+            for msg in document["messages"][-last_n:]
+        ],
+    }
+
+
+def full_load(raw: bytes):
+    return BotConversation(**bson.decode(raw))
+
+
+def record_load(raw: bytes):
+    document = bson.decode(raw)
+    return ConversationRecord(
+        chat_id=document["chat_id"],
+        bot_id=document["bot_id"],
+        messages=[MessageRecord.from_document(msg) for msg in document["messages"]],
+    )
+
+
+def measure(load, raw: bytes, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        load(raw)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    result = load(raw)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--last-n", type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        document = make_document(size)
+        repeat = max(1, 20000 // size)
+        for name, raw, load in (
+            ("full model", bson.encode(document), full_load),
+            (f"records last {args.last_n}", bson.encode(projected(document, args.last_n)), record_load),
+        ):
+            elapsed, peak = measure(load, raw, repeat)
+            print(
+                f"messages={size:<6d} {name:16s} wire={len(raw) / 1024:9.1f}KiB "
+                f"time={elapsed * 1000:8.3f}ms peak_mem={peak / 1024:9.1f}KiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
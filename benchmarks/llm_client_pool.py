@@ -0,0 +1,83 @@
+"""
+Compare a fresh AsyncOpenAI client per chat turn against the shared,
+pooled `LLMClient`, using a local fake OpenAI server.
+
+    python -m benchmarks.llm_client_pool --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.core.llm import LLMClient
+from benchmarks.fake_openai import FakeOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+async def per_request_turn(base_url: str) -> None:
+    # Mirrors the previous ChatService behaviour: a new client for each turn
+    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=base_url)
+    stream = await client.chat.completions.create(
+        model=settings.OPENAI_MODEL, messages=MESSAGES, stream=True
+    )
+    async for _ in stream:
+        pass
+    await client.close()
+
+
+async def shared_turn(llm: LLMClient) -> None:
+    async for _ in llm.stream_chat_completion(model=settings.OPENAI_MODEL, messages=MESSAGES):
+        pass
+
+
+async def run(mode: str, requests: int, concurrency: int, tokens: int) -> None:
+    async with FakeOpenAIServer(tokens=tokens) as server:
+        settings.OPENAI_BASE_URL = server.base_url
+        llm = LLMClient()
+        await llm.connect()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                if mode == "shared":
+                    await shared_turn(llm)
+                else:
+                    await per_request_turn(server.base_url)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+        await llm.close()
+
+        latencies.sort()
+        print(
+            f"{mode:12s} requests={requests} tcp_connections={server.connections} "
+            f"wall={elapsed:.2f}s rps={requests / elapsed:.0f} "
+            f"p50={statistics.median(latencies) * 1000:.1f}ms "
+            f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+    for mode in ("per-request", "shared"):
+        asyncio.run(run(mode, args.requests, args.concurrency, args.tokens))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Event loop stalls caused by logging during an error storm.
+
+A probe task sleeps `--probe-interval` ms in a loop and records how late it
+wakes up, while `--tasks` coroutines each log `--errors` exceptions with a
+traceback. The handlers write to a temporary file and to a console stream
+whose writes take `--console-delay` ms (a slow terminal or a backed-up log
+pipe). "direct" attaches the handlers to the logger as before; "queued"
+puts them behind the bounded queue and listener thread used by the app;
+"none" discards the records and shows what the storm itself costs.
+
+    python -m benchmarks.logging_stall --tasks 50 --errors 20 --console-delay 0.2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.core.logger import LOG_RECORDS_DROPPED, build_handlers, queue_handlers
+
+
+class SlowStream:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+
+    def flush(self):
+        pass
+
+
+async def probe(stop: asyncio.Event, interval: float, lateness: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lateness.append(max(loop.time() - expected, 0))
+
+
+async def error_storm(logger: logging.Logger, errors: int):
+    for i in range(errors):
+        try:
+            raise RuntimeError(f"upstream failure {i}")
+        except RuntimeError:
+            logger.exception("Error processing message")
+        await asyncio.sleep(0)
+
+
+async def run(mode: str, args, log_dir: Path):
+    handlers = build_handlers(log_dir / f"{mode}.log", json_format=True, stream=SlowStream(args.console_delay / 1000))
+    logger = logging.getLogger(f"benchmark.{mode}")
+    logger.propagate = False
+    listener = None
+    if mode == "none":
+        logger.addHandler(logging.NullHandler())
+    elif mode == "queued":
+        handler, listener = queue_handlers(handlers, args.queue_size)
+        logger.addHandler(handler)
+        listener.start()
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
+
+    stop = asyncio.Event()
+    lateness = []
+    probe_task = asyncio.create_task(probe(stop, args.probe_interval / 1000, lateness))
+    dropped = LOG_RECORDS_DROPPED.get(level="ERROR")
+    started = time.perf_counter()
+    await asyncio.gather(*(error_storm(logger, args.errors) for _ in range(args.tasks)))
+    storm = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    if listener is not None:
+        listener.stop()
+    for handler in handlers:
+        handler.close()
+
+    lateness.sort()
+    print(
+        f"{mode:7s} storm={storm * 1000:8.1f}ms probes={len(lateness):<5d} "
+        f"stall p50={statistics.median(lateness) * 1000:6.2f}ms "
+        f"p99={lateness[int(len(lateness) * 0.99) - 1] * 1000:7.2f}ms "
+        f"max={lateness[-1] * 1000:7.2f}ms "
+        f"dropped={LOG_RECORDS_DROPPED.get(level='ERROR') - dropped:.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--errors", type=int, default=20)
+    parser.add_argument("--console-delay", type=float, default=0.2)
+    parser.add_argument("--probe-interval", type=float, default=1.0)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        for mode in ("none", "direct", "queued"):
+            asyncio.run(run(mode, args, Path(log_dir)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Bytes on the wire and CPU time per streamed reply for each SSE stream mode.
+
+    python -m benchmarks.sse_stream_protocol --tokens 100 500 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from sse_starlette.sse import ServerSentEvent
+
+from app.schemas.chat import StreamMode
+from app.services.streaming import StreamEncoder, coalesce_deltas
+
+MESSAGE_ID = "5f1c0c1e-8f5e-4a4f-9a51-0c0f3f7f5e2a"
+
+
+async def fake_reply(tokens: int):
+    yield "user_message", {"message_id": "u", "type": "user", "message": "Hi", "status": "received"}
+    for i in range(tokens):
+        yield "assistant_message", {"message_id": MESSAGE_ID, "delta": f" word{i % 10}"}
+    yield "done", {"message_id": MESSAGE_ID, "status": "completed"}
+
+
+async def measure(mode: StreamMode, tokens: int, max_chars: int, checkpoint_interval: int):
+    encoder = StreamEncoder(mode, checkpoint_interval)
+    sent = frames = 0
+    cpu = time.process_time()
+    async for event_type, data in coalesce_deltas(fake_reply(tokens), max_chars=max_chars):
+        for encoded_type, payload in encoder.encode(event_type, data):
+            sent += len(ServerSentEvent(data=json.dumps(payload), event=encoded_type).encode())
+            frames += 1
+    return sent, frames, time.process_time() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--checkpoint-interval", type=int, default=64)
+    parser.add_argument("--coalesce-chars", type=int, default=32)
+    args = parser.parse_args()
+
+    variants = [
+        ("full", StreamMode.FULL, 0),
+        ("delta", StreamMode.DELTA, 0),
+        (f"delta+coalesce{args.coalesce_chars}", StreamMode.DELTA, args.coalesce_chars),
+    ]
+    for tokens in args.tokens:
+        for name, mode, max_chars in variants:
+            sent, frames, cpu = asyncio.run(measure(mode, tokens, max_chars, args.checkpoint_interval))
+            print(
+                f"tokens={tokens:<5d} {name:20s} frames={frames:<5d} "
+                f"bytes={sent:<9d} cpu={cpu * 1000:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Merge conversation documents that share a chat_id, which concurrent first
+turns could create before chat_id was unique in bot_conversations.
+
+    python -m scripts.dedupe_conversations [--dry-run]
+
+The oldest document of each chat is kept. The messages of the others are
+appended to it in the order the documents were created, skipping message_ids
+it already has, and the others are deleted. Run it before deploying the
+chat_id_unique index; it is idempotent and ends by building the indexes.
+"""
+import argparse
+import asyncio
+import sys
+from typing import List
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.database.indexes import ensure_indexes
+from app.models.conversation import BotConversation
+
+
+async def find_duplicate_chats(db: AsyncIOMotorDatabase) -> List[dict]:
+    """
+    `{"_id": chat_id, "ids": [...]}` for every chat_id held by more than one
+    conversation, with the document ids oldest first
+    """
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$chat_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    return await db[BotConversation.Config.collection_name].aggregate(pipeline).to_list(None)
+
+
+async def merge_conversations(db: AsyncIOMotorDatabase, ids: list) -> int:
+    """
+    Fold the conversations `ids` (oldest first) into the first one and
+    return how many messages were moved
+    """
+    collection = db[BotConversation.Config.collection_name]
+    documents = {doc["_id"]: doc async for doc in collection.find({"_id": {"$in": ids}})}
+    kept, *others = [documents[id] for id in ids if id in documents]
+    messages = list(kept.get("messages", []))
+    seen = {message["message_id"] for message in messages}
+    for other in others:
+        for message in other.get("messages", []):
+            if message["message_id"] not in seen:
+                seen.add(message["message_id"])
+                messages.append(message)
+
+    moved = len(messages) - len(kept.get("messages", []))
+    update = {"messages": messages}
+    if not kept.get("summary"):
+        # A summary covers the messages of the document it was written to
+        summarized = [other for other in others if other.get("summary")]
+        if summarized:
+            update["summary"] = summarized[-1]["summary"]
+            update["summary_until"] = summarized[-1].get("summary_until")
+    await collection.update_one({"_id": kept["_id"]}, {"$set": update})
+    await collection.delete_many({"_id": {"$in": [other["_id"] for other in others]}})
+    return moved
+
+
+async def dedupe(db: AsyncIOMotorDatabase, dry_run: bool) -> int:
+    duplicates = await find_duplicate_chats(db)
+    moved = 0
+    for duplicate in duplicates:
+        print(f"Chat {duplicate['_id']}: {len(duplicate['ids'])} conversations")
+        if not dry_run:
+            moved += await merge_conversations(db, duplicate["ids"])
+    if dry_run:
+        print(f"Would merge {len(duplicates)} chats")
+        return 0
+    print(f"Merged {len(duplicates)} chats, moving {moved} messages")
+    failed = await ensure_indexes(db)
+    return 1 if failed else 0
+
+
+async def run(dry_run: bool) -> int:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        return await dedupe(client[settings.MONGODB_DB_NAME], dry_run)
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report the duplicate chats")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.dry_run)))
+
+if __name__ == "__main__":
+    main()
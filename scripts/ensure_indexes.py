@@ -0,0 +1,51 @@
+"""
+Create the indexes declared by the CRUD classes and optionally check that
+no CRUD query falls back to a collection scan or a barely selective index.
+
+    python -m scripts.ensure_indexes [--explain]
+
+With --explain every known query shape is explained after the indexes are
+built; the command exits with status 1 if an index could not be built, or
+if any winning plan is a COLLSCAN or examines far more documents than it
+returns.
+"""
+import argparse
+import asyncio
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.database.indexes import QUERY_SHAPES, ensure_indexes, find_inefficient_queries
+
+
+async def run(explain: bool) -> int:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.MONGODB_DB_NAME]
+    try:
+        failed = await ensure_indexes(db)
+        if failed:
+            print(f"Could not build: {', '.join(failed)}")
+            return 1
+        print("Indexes are up to date")
+        if not explain:
+            return 0
+
+        problems = await find_inefficient_queries(db)
+        for problem in problems:
+            print(f"{problem.name}: {problem.reason}")
+        print(f"{len(QUERY_SHAPES) - len(problems)}/{len(QUERY_SHAPES)} queries use a selective index")
+        return 1 if problems else 0
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--explain", action="store_true", help="fail if any CRUD query scans far more documents than it returns")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.explain)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Move messages embedded in conversation documents into the chat_messages
+collection used by MESSAGE_STORAGE=collection.
+
+    python -m scripts.migrate_messages [--dry-run] [--batch-size 100]
+
+Switch the service to MESSAGE_STORAGE=collection before running it. The
+migration is idempotent and can run while the service is up: messages
+keep their position through a fixed sequence offset, already copied messages
+are skipped, and the embedded array is only cleared if it is exactly the one
+that was copied. Until then readers drop the embedded copies of messages
+that were already moved.
+"""
+import argparse
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.crud.message import DUPLICATE_KEY_ERROR, LEGACY_SEQ_OFFSET
+from app.database.indexes import ensure_indexes
+from app.models.conversation import BotConversation, ChatMessage
+
+
+async def migrate_conversation(db, conversation: dict, dry_run: bool) -> bool:
+    chat_id = conversation["chat_id"]
+    embedded = conversation.get("messages", [])
+    documents = [
+        ChatMessage(**{**message, "chat_id": chat_id, "seq": index - LEGACY_SEQ_OFFSET}).dict(exclude={"id"})
+        for index, message in enumerate(embedded)
+    ]
+    if dry_run:
+        return True
+
+    try:
+        await db[ChatMessage.Config.collection_name].insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+            raise
+
+    result = await db[BotConversation.Config.collection_name].update_one(
+        # The whole array must match, so an edit made while copying keeps it
+        {"_id": conversation["_id"], "messages": embedded},
+        {"$set": {"messages": []}}
+    )
+    return result.modified_count > 0
+
+
+async def migrate(dry_run: bool, batch_size: int) -> None:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.MONGODB_DB_NAME]
+    await ensure_indexes(db)
+
+    migrated = skipped = messages = 0
+    cursor = db[BotConversation.Config.collection_name].find(
+        {"messages.0": {"$exists": True}},
+        batch_size=batch_size
+    )
+    async for conversation in cursor:
+        if await migrate_conversation(db, conversation, dry_run):
+            migrated += 1
+            messages += len(conversation["messages"])
+        else:
+            skipped += 1
+            print(f"Conversation {conversation['chat_id']} changed during migration, re-run to finish it")
+
+    action = "Would migrate" if dry_run else "Migrated"
+    print(f"{action} {messages} messages from {migrated} conversations ({skipped} skipped)")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be migrated")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(migrate(args.dry_run, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
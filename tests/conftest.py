@@ -1,15 +1,23 @@
+import os
 import pytest
 import motor.motor_asyncio
 from typing import AsyncGenerator
 from datetime import datetime
+
+# Settings are read at import time; give the app modules usable defaults
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
 from app.crud.bot_info import BotInfoCRUD
 from app.crud.chat import ChatCRUD
+from app.database.indexes import ensure_indexes
 from app.models.conversation import MessageType
 
 @pytest.fixture
 async def test_db() -> AsyncGenerator:
     client = motor.motor_asyncio.AsyncIOMotorClient("mongodb://localhost:27017")
     db = client["test_chatbot_db"]
+    await ensure_indexes(db)
     yield db
     await client.drop_database("test_chatbot_db")
     client.close()
@@ -22,6 +30,10 @@ async def bot_crud(test_db) -> BotInfoCRUD:
 async def chat_crud(test_db) -> ChatCRUD:
     return ChatCRUD(test_db)
 
+@pytest.fixture
+async def split_chat_crud(test_db) -> ChatCRUD:
+    return ChatCRUD(test_db, split_messages=True)
+
 @pytest.fixture
 def sample_bot_data():
     return {
@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from app.core.admission import AdmissionController, AdmissionRejected, TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_token_bucket_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+    assert bucket.wait_time(60) == 0
+    bucket.take(90)
+    # 30 units of debt at one unit per second
+    assert bucket.wait_time() == pytest.approx(30)
+    clock.now += 100
+    # Never holds more than a minute's worth
+    assert bucket.wait_time(61) == pytest.approx(1)
+
+async def test_requests_per_minute():
+    clock = FakeClock()
+    controller = AdmissionController(4, 4, timeout=5, requests_per_minute=1, clock=clock)
+
+    async with controller.admit("bot-a"):
+        pass
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.check("bot-a")
+    assert rejected.value.reason == "rate_limited"
+    assert rejected.value.retry_after == pytest.approx(60)
+    # Other bots have their own bucket
+    controller.check("bot-b")
+
+    clock.now += 60
+    controller.check("bot-a")
+
+async def test_tokens_per_minute_charged_after_use():
+    clock = FakeClock()
+    controller = AdmissionController(4, 4, timeout=5, tokens_per_minute=60, clock=clock)
+
+    async with controller.admit("bot-a") as ticket:
+        ticket.charge(100)
+    with pytest.raises(AdmissionRejected):
+        controller.check("bot-a")
+
+    clock.now += 40
+    async with controller.admit("bot-a") as ticket:
+        assert ticket.waited == 0
+
+async def test_rate_limited_call_waits_within_timeout():
+    controller = AdmissionController(4, 4, timeout=1, requests_per_minute=600)
+    bucket = controller._buckets("bot-a")[0]
+    bucket.take(bucket.level)
+
+    async with controller.admit("bot-a") as ticket:
+        assert ticket.waited == pytest.approx(0.1, abs=0.05)
+
+async def test_bounded_queue_and_deadline():
+    controller = AdmissionController(1, 1, timeout=0.05)
+    held = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold():
+        async with controller.admit("bot-a"):
+            held.set()
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await held.wait()
+
+    async def wait_for_slot():
+        async with controller.admit("bot-a"):
+            pass
+
+    waiter = asyncio.create_task(wait_for_slot())
+    await asyncio.sleep(0)
+    assert controller.queued == 1
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.check("bot-b")
+    assert rejected.value.reason == "queue_full"
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await waiter
+    assert rejected.value.reason == "queue_timeout"
+    assert controller.queued == 0
+
+    release.set()
+    await holder
+    assert controller.in_flight == 0
+    async with controller.admit("bot-b"):
+        assert controller.in_flight == 1
@@ -0,0 +1,26 @@
+from app.core.auth import (
+    create_admin_token,
+    get_password_hash_async,
+    verify_admin_token,
+    verify_password_async,
+)
+
+BOT_ID = "65f1c0c1e8f5e4a4f9a510c0"
+
+async def test_password_hashing_off_the_event_loop():
+    hashed = await get_password_hash_async("12345678")
+    assert await verify_password_async("12345678", hashed) is True
+    assert await verify_password_async("wrong", hashed) is False
+
+def test_admin_token_round_trip():
+    token = create_admin_token(BOT_ID, "hash")
+    assert verify_admin_token(token, BOT_ID, "hash") is True
+
+def test_admin_token_rejections():
+    token = create_admin_token(BOT_ID, "hash")
+    assert verify_admin_token(token, "65f1c0c1e8f5e4a4f9a510c1", "hash") is False
+    # Changing the password revokes previously issued tokens
+    assert verify_admin_token(token, BOT_ID, "new-hash") is False
+    assert verify_admin_token(token[:-1] + ("A" if token[-1] != "A" else "B"), BOT_ID, "hash") is False
+    assert verify_admin_token(create_admin_token(BOT_ID, "hash", ttl=-1), BOT_ID, "hash") is False
+    assert verify_admin_token("garbage", BOT_ID, "hash") is False
@@ -79,4 +79,23 @@ async def test_get_all_bots(bot_crud, sample_bot_data):
     all_bots = await bot_crud.get_all_bots()
     assert len(all_bots) == 2
     assert any(bot["headline"] == sample_bot_data["headline"] for bot in all_bots)
-    assert any(bot["headline"] == "Hello, I'm Second Bot" for bot in all_bots) 
\ No newline at end of file
+    assert any(bot["headline"] == "Hello, I'm Second Bot" for bot in all_bots)
+
+async def test_get_all_bots_projection(bot_crud, sample_bot_data):
+    await bot_crud.create_bot_info(sample_bot_data)
+
+    bots = await bot_crud.get_all_bots({"headline": 1, "logo": 1, "created_at": 1})
+    assert set(bots[0]) == {"_id", "headline", "logo", "created_at"}
+
+async def test_find_bots_pages(bot_crud, sample_bot_data):
+    for headline in ["Alpha", "Beta", "Alpine", "Gamma"]:
+        await bot_crud.create_bot_info({**sample_bot_data, "headline": headline})
+
+    first = await bot_crud.find_bots(limit=2).to_list(length=None)
+    rest = await bot_crud.find_bots(after=str(first[-1]["_id"])).to_list(length=None)
+    assert [bot["headline"] for bot in first + rest] == ["Alpha", "Beta", "Alpine", "Gamma"]
+
+    matching = await bot_crud.find_bots(headline_prefix="Alp").to_list(length=None)
+    assert [bot["headline"] for bot in matching] == ["Alpha", "Alpine"]
+    # The prefix is literal text, not a pattern
+    assert await bot_crud.find_bots(headline_prefix=".").to_list(length=None) == []
@@ -0,0 +1,177 @@
+import asyncio
+import time
+from starlette.requests import Request
+from app.core.cache import CachedBody, TTLCache, cached_response, etag_matches
+from app.core.config import settings
+from app.core.llm import LLMClient
+from app.crud.bot_info import BotInfoCRUD
+from app.crud.bot_cache import BotInfoCache, BotResponseCache, starter_replies
+from app.crud.response_cache import ResponseCache, ResponseCacheCRUD, response_key
+from app.services.starter_answers import precompute_starter_answers
+from benchmarks.fake_openai import FakeOpenAIServer
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache("test_lru", max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+def test_ttl_cache_expiry(monkeypatch):
+    cache = TTLCache("test_ttl", max_size=10, ttl=5)
+    cache.set("a", 1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+async def test_bot_info_cache(test_db, bot_crud, sample_bot_data):
+    created_bot = await bot_crud.create_bot_info(sample_bot_data)
+    bot_id = str(created_bot["_id"])
+    cache = BotInfoCache()
+
+    cached = await cache.get(test_db, bot_id)
+    assert cached.bot_info["headline"] == sample_bot_data["headline"]
+    assert sample_bot_data["secondary_description"] in cached.system_prompt
+
+    await bot_crud.update_bot_info(bot_id, {"secondary_description": "Updated description"})
+    assert (await cache.get(test_db, bot_id)).bot_info["secondary_description"] == sample_bot_data["secondary_description"]
+
+    cache.invalidate(bot_id)
+    refreshed = await cache.get(test_db, bot_id)
+    assert "Updated description" in refreshed.system_prompt
+    assert refreshed.version == 1
+
+async def test_bot_info_cache_skips_reads_raced_by_invalidation(test_db, monkeypatch):
+    started = asyncio.Event()
+    release = asyncio.Event()
+    reads = []
+
+    async def slow_read(self, bot_id):
+        reads.append(bot_id)
+        if len(reads) == 1:
+            started.set()
+            await release.wait()
+            return {"_id": bot_id, "headline": "stale"}
+        return {"_id": bot_id, "headline": "fresh"}
+
+    monkeypatch.setattr(BotInfoCRUD, "get_bot_by_id", slow_read)
+    cache = BotInfoCache()
+    stale = asyncio.create_task(cache.get(test_db, "some-bot"))
+    await started.wait()
+    cache.invalidate("some-bot")
+
+    # A read after the change does not join the one that started before it
+    assert (await asyncio.wait_for(cache.get(test_db, "some-bot"), 1)).bot_info["headline"] == "fresh"
+    release.set()
+    assert (await stale).bot_info["headline"] == "stale"
+    assert cache.cache.get("some-bot").bot_info["headline"] == "fresh"
+    assert len(reads) == 2
+
+def _request(headers=None):
+    raw = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/bot", "headers": raw})
+
+def test_cached_response_etag():
+    cached = CachedBody.from_content([{"id": "1", "headline": "Hé"}])
+    assert cached.body == '[{"id":"1","headline":"Hé"}]'.encode()
+    assert CachedBody.from_content([{"id": "1", "headline": "Hé"}]).etag == cached.etag
+
+    response = cached_response(_request(), cached, {"admin-token": "t"})
+    assert response.status_code == 200
+    assert response.body == cached.body
+    assert response.headers["etag"] == cached.etag
+    assert response.headers["admin-token"] == "t"
+
+    response = cached_response(_request({"If-None-Match": f'"other", W/{cached.etag}'}), cached)
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == cached.etag
+
+    assert etag_matches("*", cached.etag)
+    assert not etag_matches(None, cached.etag)
+
+async def test_bot_response_cache_invalidation():
+    responses = BotResponseCache()
+    calls = []
+
+    async def build():
+        calls.append(1)
+        return CachedBody.from_content([{"id": str(len(calls))}])
+
+    first = await responses.get(responses.list_key(None, 10), build)
+    assert await responses.get(responses.list_key(None, 10), build) is first
+    assert len(calls) == 1
+
+    # Any bot change drops every list page
+    responses.invalidate("some-bot")
+    second = await responses.get(responses.list_key(None, 10), build)
+    assert second.etag != first.etag
+
+    # A body read while the bot changed is served but not kept
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_build():
+        started.set()
+        await release.wait()
+        return CachedBody.from_content({"id": "stale"})
+
+    responses.invalidate("some-bot")
+    task = asyncio.create_task(responses.get("some-bot", slow_build))
+    await started.wait()
+    responses.invalidate("some-bot")
+    release.set()
+    assert (await task).body == b'{"id":"stale"}'
+    assert responses.cache.get("some-bot") is None
+
+def test_response_key():
+    key = response_key("bot", "prompt", ["default"], "What are your  hours?")
+    assert response_key("bot", "prompt", ["default"], " what are your hours? ") == key
+    assert response_key("bot", "edited prompt", ["default"], "What are your hours?") != key
+    assert response_key("bot", "prompt", ["backup"], "What are your hours?") != key
+    assert response_key("other", "prompt", ["default"], "What are your hours?") != key
+
+async def test_response_cache_persistent_tier(test_db, monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_PERSISTENT", True)
+    key = response_key("bot", "prompt", ["default"], "Hi")
+    await ResponseCache().set(test_db, key, "bot", "Hi", "Hello!")
+
+    # Another worker finds the reply in MongoDB and keeps it in memory
+    cache = ResponseCache()
+    assert await cache.get(test_db, key) == "Hello!"
+    assert cache.cache.get(key) == "Hello!"
+    assert await cache.get(test_db, response_key("bot", "prompt", ["default"], "Bye")) is None
+
+    await ResponseCacheCRUD(test_db).set_reply(key, "bot", "Hi", "Hello!", ttl=-1)
+    assert await ResponseCache().get(test_db, key) is None
+
+
+async def test_starter_answers_follow_bot_content(test_db, bot_crud, sample_bot_data, monkeypatch):
+    created_bot = await bot_crud.create_bot_info(sample_bot_data)
+    bot_id = str(created_bot["_id"])
+    llm = LLMClient()
+    try:
+        async with FakeOpenAIServer(tokens=2) as server:
+            monkeypatch.setattr(settings, "OPENAI_BASE_URL", server.base_url)
+            assert await precompute_starter_answers(test_db, bot_id, llm)
+            assert server.requests == 2
+            # Current answers are not generated again
+            assert await precompute_starter_answers(test_db, bot_id, llm)
+            assert server.requests == 2
+    finally:
+        await llm.close()
+
+    bot_info = await bot_crud.get_bot_by_id(bot_id)
+    assert starter_replies(bot_info) == {"learn about our services": "tok0 tok1 ", "get support": "tok0 tok1 "}
+
+    # Answers computed for an older version are neither stored nor served
+    assert not await bot_crud.set_starter_answers(bot_id, 1, {})
+    await bot_crud.update_bot_info(bot_id, {"secondary_description": "Updated description"})
+    assert starter_replies(await bot_crud.get_bot_by_id(bot_id)) == {}
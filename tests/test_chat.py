@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from app.models.conversation import BotConversation, Message
 from datetime import datetime
@@ -102,4 +103,234 @@ async def test_delete_message(chat_crud, sample_conversation):
     
     # Verify message was marked as deleted
     updated_conv = await chat_crud.get_conversation(sample_conversation.chat_id)
-    assert updated_conv.messages[0].is_deleted is True 
\ No newline at end of file
+    assert updated_conv.messages[0].is_deleted is True
+
+async def test_edit_message_returns_result(chat_crud, sample_conversation, sample_message_data):
+    await chat_crud.create_conversation(sample_conversation)
+    await chat_crud.add_message(
+        sample_conversation.chat_id,
+        Message(**{**sample_message_data, "message_id": "test_msg_2", "message": "How are you?"})
+    )
+
+    history = await chat_crud.edit_message(
+        sample_conversation.chat_id, "test_msg_1", "Edited", bot_id=sample_conversation.bot_id
+    )
+    assert history["bot_id"] == sample_conversation.bot_id
+    assert [msg["message"] for msg in history["messages"]] == ["Edited", "How are you?"]
+    assert history["messages"][0]["versions"] == ["Edited"]
+
+    edited = await chat_crud.edit_message(
+        sample_conversation.chat_id, "test_msg_2", bot_id=sample_conversation.bot_id, message_only=True
+    )
+    assert edited["messages"] == [{
+        "message_id": "test_msg_2",
+        "type": sample_message_data["type"],
+        "message": "How are you?",
+        "is_deleted": True,
+        "versions": []
+    }]
+
+    assert await chat_crud.edit_message(sample_conversation.chat_id, "missing", "Edited") is None
+    assert await chat_crud.edit_message(sample_conversation.chat_id, "test_msg_1", "Edited", bot_id="other_bot") is None
+
+async def test_first_turn_upserts_conversation(chat_crud, sample_conversation, sample_message_data):
+    new_conversation = sample_conversation.copy(update={"messages": []})
+    turns = [
+        [Message(**{**sample_message_data, "message_id": f"turn_{i}_{j}"}) for j in range(2)]
+        for i in range(2)
+    ]
+    # Two first messages of the same chat racing each other
+    results = await asyncio.gather(*(
+        chat_crud.add_messages(sample_conversation.chat_id, messages, new_conversation) for messages in turns
+    ))
+    assert results == [True, True]
+
+    assert await chat_crud.collection.count_documents({"chat_id": sample_conversation.chat_id}) == 1
+    conversation = await chat_crud.get_conversation(sample_conversation.chat_id)
+    assert conversation.bot_id == sample_conversation.bot_id
+    assert sorted(msg.message_id for msg in conversation.messages) == ["turn_0_0", "turn_0_1", "turn_1_0", "turn_1_1"]
+
+async def test_split_storage_add_and_get_recent(split_chat_crud, sample_conversation, sample_message_data):
+    await split_chat_crud.create_conversation(sample_conversation)
+    for i in range(2, 6):
+        await split_chat_crud.add_messages(
+            sample_conversation.chat_id,
+            [Message(**{**sample_message_data, "message_id": f"test_msg_{i}", "message": f"Message {i}"})]
+        )
+
+    stored = await split_chat_crud.db["bot_conversations"].find_one({"chat_id": sample_conversation.chat_id})
+    assert stored["messages"] == []
+
+    full = await split_chat_crud.get_conversation(sample_conversation.chat_id)
+    assert [msg.message_id for msg in full.messages] == [f"test_msg_{i}" for i in range(1, 6)]
+
+    recent = await split_chat_crud.get_conversation(sample_conversation.chat_id, last_n=2)
+    assert [msg.message for msg in recent.messages] == ["Message 4", "Message 5"]
+
+async def test_split_storage_reads_legacy_embedded_messages(chat_crud, split_chat_crud, sample_conversation, sample_message_data):
+    # Written by the embedded storage before switching modes
+    await chat_crud.create_conversation(sample_conversation)
+    await split_chat_crud.add_messages(
+        sample_conversation.chat_id,
+        [Message(**{**sample_message_data, "message_id": "test_msg_2", "message": "After switch"})]
+    )
+
+    conversation = await split_chat_crud.get_conversation(sample_conversation.chat_id)
+    assert [msg.message_id for msg in conversation.messages] == ["test_msg_1", "test_msg_2"]
+
+    assert await split_chat_crud.update_message(sample_conversation.chat_id, "test_msg_1", "Edited") is True
+    assert await split_chat_crud.delete_message(sample_conversation.chat_id, "test_msg_2") is True
+    conversation = await split_chat_crud.get_conversation(sample_conversation.chat_id)
+    assert conversation.messages[0].message == "Edited"
+    assert conversation.messages[1].is_deleted is True
+
+async def test_split_storage_half_migrated_conversation(chat_crud, split_chat_crud, sample_conversation, sample_message_data):
+    from scripts.migrate_messages import migrate_conversation
+
+    await chat_crud.create_conversation(sample_conversation)
+    await chat_crud.add_messages(
+        sample_conversation.chat_id,
+        [Message(**{**sample_message_data, "message_id": "test_msg_2", "message": "Message 2"})]
+    )
+    collection = chat_crud.db["bot_conversations"]
+    stored = await collection.find_one({"chat_id": sample_conversation.chat_id})
+
+    # Edited after the migration read it: same size, different array
+    await collection.update_one({"_id": stored["_id"]}, {"$set": {"messages.0.message": "Edited"}})
+    assert await migrate_conversation(chat_crud.db, stored, dry_run=False) is False
+    assert len((await collection.find_one({"chat_id": sample_conversation.chat_id}))["messages"]) == 2
+
+    conversation = await split_chat_crud.get_conversation(sample_conversation.chat_id)
+    assert [msg.message_id for msg in conversation.messages] == ["test_msg_1", "test_msg_2"]
+    record = await split_chat_crud.get_recent_conversation(sample_conversation.chat_id)
+    assert [msg.message_id for msg in record.messages] == ["test_msg_1", "test_msg_2"]
+
+
+async def test_get_recent_conversation(chat_crud, sample_conversation, sample_message_data):
+    await chat_crud.create_conversation(sample_conversation)
+    await chat_crud.add_messages(
+        sample_conversation.chat_id,
+        [Message(**{**sample_message_data, "message_id": f"test_msg_{i}", "message": f"Message {i}"}) for i in range(2, 5)]
+    )
+
+    record = await chat_crud.get_recent_conversation(sample_conversation.chat_id, last_n=2)
+    assert record.bot_id == sample_conversation.bot_id
+    assert [msg.message_id for msg in record.messages] == ["test_msg_3", "test_msg_4"]
+    assert record.messages[-1].message == "Message 4"
+    assert record.messages[-1].is_deleted is False
+
+    assert await chat_crud.get_recent_conversation("non_existent_chat") is None
+
+async def add_numbered_messages(crud, conversation, sample_message_data, count):
+    await crud.create_conversation(conversation)
+    await crud.add_messages(
+        conversation.chat_id,
+        [Message(**{**sample_message_data, "message_id": f"test_msg_{i}", "message": f"Message {i}"}) for i in range(2, count + 1)]
+    )
+
+async def check_history_pages(crud, sample_conversation, sample_message_data):
+    await add_numbered_messages(crud, sample_conversation, sample_message_data, 6)
+    await crud.delete_message(sample_conversation.chat_id, "test_msg_4")
+    chat_id, bot_id = sample_conversation.chat_id, sample_conversation.bot_id
+
+    latest = await crud.get_history_page(chat_id, bot_id, limit=2)
+    assert [msg["message_id"] for msg in latest.messages] == ["test_msg_5", "test_msg_6"]
+    assert latest.has_older is True and latest.has_newer is False
+
+    older = await crud.get_history_page(chat_id, bot_id, before="test_msg_5", limit=2, include_deleted=False)
+    assert [msg["message_id"] for msg in older.messages] == ["test_msg_2", "test_msg_3"]
+    assert older.has_older is True and older.has_newer is True
+
+    newer = await crud.get_history_page(chat_id, bot_id, after="test_msg_3", limit=5, include_versions=False)
+    assert [msg["message_id"] for msg in newer.messages] == ["test_msg_4", "test_msg_5", "test_msg_6"]
+    assert newer.has_newer is False
+    assert "versions" not in newer.messages[0]
+
+    unknown = await crud.get_history_page(chat_id, bot_id, before="missing", limit=2)
+    assert unknown.cursor_found is False
+    assert await crud.get_history_page(chat_id, "other_bot") is None
+
+async def test_get_history_page(chat_crud, sample_conversation, sample_message_data):
+    await check_history_pages(chat_crud, sample_conversation, sample_message_data)
+
+async def test_get_history_page_split_storage(split_chat_crud, sample_conversation, sample_message_data):
+    await check_history_pages(split_chat_crud, sample_conversation, sample_message_data)
+
+async def test_disconnect_closes_upstream_and_keeps_partial_reply(test_db, bot_crud, sample_bot_data, monkeypatch):
+    from app.core.config import settings
+    from app.core.llm import LLMClient
+    from app.crud.chat import ChatCRUD
+    from app.schemas.chat import MessageCreate
+    from app.crud.turn_writer import turn_writer
+    from app.services.chat import CHAT_INTERRUPTED_TOKENS, ChatService
+    from benchmarks.fake_openai import FakeOpenAIServer
+
+    bot = await bot_crud.create_bot_info(sample_bot_data)
+    llm = LLMClient()
+    disconnected = asyncio.Event()
+    interrupted_tokens = CHAT_INTERRUPTED_TOKENS.get()
+    try:
+        async with FakeOpenAIServer(tokens=200, token_delay=0.01) as server:
+            monkeypatch.setattr(settings, "OPENAI_BASE_URL", server.base_url)
+            message = MessageCreate(chat_id="disconnect_chat", bot_id=str(bot["_id"]), message="Hi")
+            deltas = 0
+            async for event_type, _ in ChatService(test_db, llm).process_message(message, disconnected):
+                assert event_type != "done"
+                if event_type == "assistant_message":
+                    deltas += 1
+                    if deltas == 3:
+                        disconnected.set()
+            # Waits for the interrupted turn, saved in the background
+            await turn_writer.stop()
+            await asyncio.sleep(0.1)
+            assert server.cancelled == 1
+    finally:
+        await llm.close()
+
+    conversation = await ChatCRUD(test_db).get_conversation("disconnect_chat")
+    reply = conversation.messages[1]
+    assert reply.interrupted is True
+    assert reply.message == "tok0 tok1 tok2 "
+    assert CHAT_INTERRUPTED_TOKENS.get() - interrupted_tokens == 3
+
+@pytest.mark.parametrize("response_cache_enabled", [False, True])
+async def test_invalid_bot_id_still_completes_the_turn(test_db, monkeypatch, response_cache_enabled):
+    from app.core.config import settings
+    from app.crud.chat import ChatCRUD
+    from app.schemas.chat import MessageCreate
+    from app.services.chat import ChatService
+
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", response_cache_enabled)
+    message = MessageCreate(chat_id="invalid_bot_chat", bot_id="not-an-objectid", message="Hi")
+    events = [event async for event in ChatService(test_db).process_message(message)]
+
+    assert [event_type for event_type, _ in events] == ["user_message", "assistant_message", "done"]
+    assert events[1][1]["delta"] == "AI call failed"
+    conversation = await ChatCRUD(test_db).get_conversation("invalid_bot_chat")
+    assert [msg.message for msg in conversation.messages] == ["Hi", ""]
+
+async def test_failed_starter_answer_lookup_falls_back_to_the_model(test_db, bot_crud, sample_bot_data, monkeypatch):
+    from app.core.config import settings
+    from app.core.llm import LLMClient
+    from app.schemas.chat import MessageCreate
+    from app.services import chat
+    from benchmarks.fake_openai import FakeOpenAIServer
+
+    def broken(message):
+        raise RuntimeError("lookup failed")
+
+    monkeypatch.setattr(settings, "STARTER_ANSWERS_PRECOMPUTE", True)
+    monkeypatch.setattr(chat, "normalize_message", broken)
+    bot = await bot_crud.create_bot_info(sample_bot_data)
+    llm = LLMClient()
+    try:
+        async with FakeOpenAIServer(tokens=2) as server:
+            monkeypatch.setattr(settings, "OPENAI_BASE_URL", server.base_url)
+            message = MessageCreate(chat_id="starter_fallback_chat", bot_id=str(bot["_id"]), message="Get support")
+            events = [event async for event in chat.ChatService(test_db, llm).process_message(message)]
+            assert server.requests == 1
+    finally:
+        await llm.close()
+
+    assert "".join(data["delta"] for event_type, data in events if event_type == "assistant_message") == "tok0 tok1 "
+    assert events[-1][0] == "done"
@@ -0,0 +1,44 @@
+from app.models.conversation import Message, MessageType
+from app.core.constants import THIS_MESSAGE_WAS_DELETED
+from app.services.context import build_context, count_tokens
+
+def make_history(count, words=20):
+    return [
+        Message(
+            message_id=f"msg_{i}",
+            type=MessageType.USER if i % 2 == 0 else MessageType.ASSISTANT,
+            message=" ".join(f"word{i}" for _ in range(words))
+        )
+        for i in range(count)
+    ]
+
+def test_keeps_most_recent_turns_within_budget():
+    history = make_history(50)
+    context = build_context("You are a bot", history, "Hello", budget=500)
+
+    assert context.prompt_tokens <= 500
+    assert context.messages[0]["role"] == "system"
+    assert context.messages[-1] == {"role": "user", "content": "Hello"}
+    kept = context.messages[1:-1]
+    assert 0 < len(kept) < 50
+    assert kept[-1]["content"] == history[-1].message
+    assert [msg.message_id for msg in context.dropped] == [f"msg_{i}" for i in range(50 - len(kept))]
+
+def test_everything_fits():
+    history = make_history(3)
+    context = build_context("You are a bot", history, "Hello", budget=10_000)
+    assert len(context.messages) == 5
+    assert context.dropped == []
+
+def test_summary_and_deleted_messages():
+    history = make_history(2)
+    history[0].is_deleted = True
+    context = build_context("You are a bot", history, "Hello", budget=10_000, summary="User asked about pricing")
+
+    assert context.messages[1]["role"] == "system"
+    assert "User asked about pricing" in context.messages[1]["content"]
+    assert context.messages[2] == {"role": "user", "content": THIS_MESSAGE_WAS_DELETED}
+    assert context.messages[3]["role"] == "assistant"
+
+def test_count_tokens_grows_with_text():
+    assert count_tokens("hello " * 100) > count_tokens("hello")
@@ -0,0 +1,92 @@
+import asyncio
+from app.schemas.chat import StreamMode
+from app.services import generations
+from app.services.generations import Generation, GenerationRegistry, parse_event_id
+from app.services.streaming import StreamEncoder
+
+def make_generation(mode=StreamMode.DELTA, max_events=100, grace=0.0):
+    return Generation("m1", "c1", "b1", StreamEncoder(mode), max_events=max_events, grace=grace)
+
+def publish_deltas(generation, deltas):
+    for delta in deltas:
+        generation.publish("assistant_message", {"message_id": "m1", "delta": delta})
+
+async def collect(generation, after=0):
+    return [frame async for frame in generation.follow(after)]
+
+def test_parse_event_id():
+    assert parse_event_id("5b0f-aa:12") == ("5b0f-aa", 12)
+    assert parse_event_id("12") is None
+    assert parse_event_id("m1:x") is None
+
+async def test_follow_resumes_after_last_event_id():
+    generation = make_generation()
+    publish_deltas(generation, ["a", "b"])
+    follower = asyncio.create_task(collect(generation, after=1))
+    await asyncio.sleep(0)
+    publish_deltas(generation, ["c"])
+    generation.finish()
+
+    frames = await follower
+    assert [event_id for event_id, _, _ in frames] == ["m1:2", "m1:3"]
+    assert [data["delta"] for _, _, data in frames] == ["b", "c"]
+
+async def test_dropped_frames_are_replaced_by_a_checkpoint():
+    generation = make_generation(max_events=2)
+    publish_deltas(generation, ["a", "b", "c", "d"])
+    generation.finish()
+
+    frames = await collect(generation, after=1)
+    assert frames[0] == ("m1:2", "checkpoint", {"message_id": "m1", "offset": 2, "buffer": "ab"})
+    assert [data["delta"] for _, _, data in frames[1:]] == ["c", "d"]
+
+async def test_abandoned_after_grace_without_clients():
+    generation = make_generation(grace=0.02)
+    generation.attach()
+    generation.detach()
+    assert not generation.abandoned.is_set()
+    # A client that reconnects in time keeps the turn going
+    generation.attach()
+    await asyncio.sleep(0.04)
+    assert not generation.abandoned.is_set()
+
+    generation.detach()
+    await asyncio.sleep(0.04)
+    assert generation.abandoned.is_set()
+
+async def test_registry_keeps_finished_turns():
+    registry = GenerationRegistry(ttl=60, max_size=10)
+
+    async def events():
+        yield "assistant_message", {"message_id": "m1", "delta": "hi"}
+
+    generation = make_generation()
+    registry.start(generation, events())
+    assert registry.get("m1") is generation
+    await asyncio.gather(*registry._tasks)
+    assert generation.done
+    assert "m1" not in registry.live
+    assert registry.get("m1") is generation
+
+async def test_turn_without_any_client_is_abandoned(monkeypatch):
+    monkeypatch.setattr(generations, "FIRST_CLIENT_SECONDS", 0.02)
+    registry = GenerationRegistry(ttl=60, max_size=10)
+    generation = make_generation()
+
+    async def events():
+        await generation.abandoned.wait()
+        yield "done", {"message_id": "m1"}
+
+    # The response was never sent, so nothing attaches or detaches
+    registry.start(generation, events())
+    await asyncio.wait_for(asyncio.gather(*registry._tasks), 1)
+    assert generation.abandoned.is_set()
+
+async def test_full_mode_frames_do_not_store_the_buffer():
+    generation = make_generation(mode=StreamMode.FULL)
+    publish_deltas(generation, ["a", "b", "c"])
+    generation.finish()
+
+    assert all("buffer" not in frame.data for frame in generation.frames)
+    frames = await collect(generation)
+    assert [(data["delta"], data["buffer"]) for _, _, data in frames] == [("a", "a"), ("b", "ab"), ("c", "abc")]
@@ -0,0 +1,41 @@
+from app.crud.bot_info import BotInfoCRUD
+from app.crud.chat import ChatCRUD
+from app.crud.message import MessageCRUD
+from app.database.indexes import ensure_indexes, find_inefficient_queries
+
+async def test_ensure_indexes_is_idempotent(test_db):
+    await ensure_indexes(test_db)
+    chat_indexes = await ChatCRUD(test_db).collection.index_information()
+    message_indexes = await MessageCRUD(test_db).collection.index_information()
+
+    assert {"chat_id_unique", "chat_id_message_id"} <= set(chat_indexes)
+    assert chat_indexes["chat_id_unique"]["unique"]
+    assert {"chat_id_seq", "chat_id_message_id"} <= set(message_indexes)
+
+async def test_no_inefficient_queries(test_db):
+    await ensure_indexes(test_db)
+    # Enough data that a barely selective plan shows in the examined counts
+    await BotInfoCRUD(test_db).collection.insert_many(
+        [{"headline": f"Bot {i}"} for i in range(50)] + [{"headline": "hello"}]
+    )
+    assert await find_inefficient_queries(test_db) == []
+
+async def test_duplicate_chats_are_reported_and_merged(test_db):
+    from scripts.dedupe_conversations import dedupe
+
+    collection = ChatCRUD(test_db).collection
+    await collection.drop_indexes()
+    await collection.create_index([("chat_id", 1), ("bot_id", 1)], name="chat_id_bot_id")
+    await collection.insert_many([
+        {"chat_id": "c1", "bot_id": "b1", "messages": [{"message_id": "m1"}, {"message_id": "m2"}]},
+        {"chat_id": "c1", "bot_id": "b1", "messages": [{"message_id": "m2"}, {"message_id": "m3"}]},
+    ])
+
+    # Startup goes on without the unique index
+    assert await ensure_indexes(test_db) == ["chat_id_unique"]
+    assert "chat_id_bot_id" not in await collection.index_information()
+
+    assert await dedupe(test_db, dry_run=False) == 0
+    conversations = await collection.find({"chat_id": "c1"}).to_list(None)
+    assert [[message["message_id"] for message in conv["messages"]] for conv in conversations] == [["m1", "m2", "m3"]]
+    assert "chat_id_unique" in await collection.index_information()
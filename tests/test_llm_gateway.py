@@ -0,0 +1,71 @@
+import time
+import pytest
+from app.core.config import settings
+from app.core.llm import LLM_HEDGES, LLMClient, LLMGateway
+from benchmarks.fake_openai import FakeOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+@pytest.fixture
+async def llm():
+    client = LLMClient()
+    yield client
+    await client.close()
+
+async def reply(gateway: LLMGateway, endpoints=("default",)) -> str:
+    return "".join([
+        chunk.choices[0].delta.content or ""
+        async for chunk in gateway.stream_chat_completion(endpoints, messages=MESSAGES)
+        if chunk.choices
+    ])
+
+async def time_to_first_token(gateway: LLMGateway) -> float:
+    started = time.perf_counter()
+    first = None
+    async for chunk in gateway.stream_chat_completion(["default"], messages=MESSAGES):
+        if first is None and chunk.choices and chunk.choices[0].delta.content:
+            first = time.perf_counter() - started
+    return first
+
+async def test_retries_before_first_token(llm, monkeypatch):
+    async with FakeOpenAIServer(tokens=3, status=lambda n: 503 if n <= 2 else 200) as server:
+        monkeypatch.setattr(settings, "OPENAI_BASE_URL", server.base_url)
+        gateway = LLMGateway(llm, retries=2, backoff=0.01)
+        assert await reply(gateway) == "tok0 tok1 tok2 "
+        assert server.requests == 3
+
+async def test_client_errors_are_not_retried(llm, monkeypatch):
+    async with FakeOpenAIServer(status=400) as server:
+        monkeypatch.setattr(settings, "OPENAI_BASE_URL", server.base_url)
+        gateway = LLMGateway(llm, retries=2, backoff=0.01)
+        with pytest.raises(Exception):
+            await reply(gateway)
+        assert server.requests == 1
+
+async def test_failover_to_next_endpoint(llm, monkeypatch):
+    async with FakeOpenAIServer(status=500) as primary, FakeOpenAIServer(tokens=2) as backup:
+        monkeypatch.setattr(settings, "OPENAI_BASE_URL", primary.base_url)
+        monkeypatch.setattr(settings, "LLM_ENDPOINTS", {"backup": {"base_url": backup.base_url, "model": "backup-model"}})
+        gateway = LLMGateway(llm, retries=1, backoff=0.01)
+        assert await reply(gateway, ["default", "unknown", "backup"]) == "tok0 tok1 "
+        assert primary.requests == 2
+        assert backup.requests == 1
+
+async def test_hedging_cuts_time_to_first_token_tail(llm, monkeypatch):
+    # Odd-numbered requests stall well past the hedging threshold. Unhedged
+    # turns alternate between stalled and fast; a hedged turn's primary is
+    # always odd and its hedge even, so every hedged turn is saved by its hedge.
+    stall = lambda n: 0.5 if n % 2 else 0.0
+    async with FakeOpenAIServer(tokens=5, first_token_delay=stall) as server:
+        monkeypatch.setattr(settings, "OPENAI_BASE_URL", server.base_url)
+
+        plain = LLMGateway(llm, retries=0)
+        unhedged = [await time_to_first_token(plain) for _ in range(4)]
+
+        hedge_wins = LLM_HEDGES.get(winner="hedge")
+        hedged_gateway = LLMGateway(llm, retries=0, hedge_after=0.05)
+        hedged = [await time_to_first_token(hedged_gateway) for _ in range(4)]
+
+    assert max(unhedged) >= 0.5
+    assert max(hedged) < 0.25
+    assert LLM_HEDGES.get(winner="hedge") - hedge_wins == 4
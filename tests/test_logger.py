@@ -0,0 +1,44 @@
+import json
+import sys
+import logging
+
+from app.core.logger import LOG_RECORDS_DROPPED, JsonFormatter, queue_handlers
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    test_logger = logging.getLogger(name)
+    test_logger.propagate = False
+    test_logger.addHandler(handler)
+    return test_logger
+
+def test_json_formatter_includes_extra_and_exception():
+    record = logging.makeLogRecord({
+        "name": "chatbot", "levelname": "ERROR", "levelno": logging.ERROR,
+        "msg": "failed %s", "args": ("turn",), "chat_id": "c1"
+    })
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        record.exc_info = sys.exc_info()
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "failed turn"
+    assert entry["level"] == "ERROR"
+    assert entry["chat_id"] == "c1"
+    assert "ValueError: bad" in entry["exception"]
+
+def test_queue_handler_drops_when_full():
+    output = []
+    sink = logging.Handler()
+    sink.emit = lambda record: output.append(record.getMessage())
+    handler, listener = queue_handlers([sink], max_size=2)
+    test_logger = make_logger("test_queue_drop", handler)
+    dropped = LOG_RECORDS_DROPPED.get(level="ERROR")
+
+    # Nothing drains the queue until the listener starts
+    for i in range(5):
+        test_logger.error("record %d", i)
+    assert LOG_RECORDS_DROPPED.get(level="ERROR") == dropped + 3
+
+    listener.start()
+    listener.stop()
+    assert output == ["record 0", "record 1"]
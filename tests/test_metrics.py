@@ -0,0 +1,76 @@
+from app.core.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+def test_render_prometheus_text(monkeypatch):
+    from app.core import metrics
+    monkeypatch.setattr(metrics, "registry", MetricsRegistry())
+
+    requests = Counter("test_requests_total", "Requests", ["route"])
+    requests.inc(route="/chat")
+    requests.inc(2, route="/chat")
+    open_streams = Gauge("test_open_streams", "Open streams")
+    open_streams.inc()
+    latency = Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    text = metrics.registry.render()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{route="/chat"} 3' in text
+    assert "test_open_streams 1" in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "test_latency_seconds_count 2" in text
+
+def test_updates_from_driver_threads(monkeypatch):
+    import sys
+    import threading
+    from app.core import metrics
+    monkeypatch.setattr(metrics, "registry", MetricsRegistry())
+    switch_interval = sys.getswitchinterval()
+
+    commands = Counter("test_commands_total", "Commands", ["address"])
+    durations = Histogram("test_command_seconds", "Durations", ["address"], buckets=(0.1,))
+
+    def work(thread: int):
+        for i in range(2000):
+            # New label values keep growing the dicts while they are rendered
+            commands.inc(address=f"{thread}:{i}")
+            durations.observe(0.05, address=f"{thread}:{i}")
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    # Switch threads often enough for an unguarded render to race the updates
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            metrics.registry.render()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert sum(commands.values.values()) == 8000
+    assert sum(state[-1] for state in durations.values.values()) == 8000
+
+def test_metrics_middleware_labels_route_templates():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS, MetricsMiddleware
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/test-items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    for item_id in ("a", "b"):
+        assert client.get(f"/test-items/{item_id}").status_code == 200
+    assert client.get("/missing").status_code == 404
+
+    assert HTTP_REQUESTS.get(method="GET", route="/test-items/{item_id}", status=200) == 2
+    assert HTTP_REQUESTS.get(method="GET", route="unmatched", status=404) >= 1
+    assert HTTP_REQUEST_DURATION.count(method="GET", route="/test-items/{item_id}") == 2
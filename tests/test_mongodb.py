@@ -0,0 +1,56 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.database.mongodb import available_compressors, client_options, history_database, stream_database
+from app.database.monitoring import (
+    POOL_CHECKED_OUT,
+    POOL_CHECKOUT_SECONDS,
+    POOL_CONNECTIONS,
+    POOL_WAITING,
+    PoolMetricsListener
+)
+
+def test_client_options(monkeypatch):
+    monkeypatch.setattr(settings, "MONGODB_MAX_POOL_SIZE", 50)
+    monkeypatch.setattr(settings, "MONGODB_MIN_POOL_SIZE", None)
+    monkeypatch.setattr(settings, "MONGODB_WAIT_QUEUE_TIMEOUT_MS", 2000)
+    monkeypatch.setattr(settings, "MONGODB_COMPRESSORS", "zlib")
+
+    options = client_options()
+    assert options["maxPoolSize"] == 50
+    assert options["waitQueueTimeoutMS"] == 2000
+    assert options["compressors"] == ["zlib"]
+    assert "minPoolSize" not in options
+
+def test_available_compressors_skips_missing_libraries(monkeypatch):
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None if name == "zstandard" else object())
+    assert available_compressors("zstd, snappy") == ["snappy"]
+    assert available_compressors(None) == []
+
+def test_per_operation_options(monkeypatch):
+    db = AsyncIOMotorClient("mongodb://localhost:27017", connect=False)["test_chatbot_db"]
+    assert history_database(db) is db
+    assert stream_database(db) is db
+
+    monkeypatch.setattr(settings, "MONGODB_HISTORY_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setattr(settings, "MONGODB_STREAM_WRITE_CONCERN", "1")
+    assert history_database(db).read_preference.mongos_mode == "secondaryPreferred"
+    assert stream_database(db).write_concern.document == {"w": 1}
+
+def test_pool_metrics_listener():
+    listener = PoolMetricsListener()
+    address = ("pool-test", 27017)
+    listener.connection_created(monitoring.ConnectionCreatedEvent(address, 1))
+    listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(address))
+    assert POOL_WAITING.get(address="pool-test:27017") == 1
+
+    listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(address, 1, 0.002))
+    assert POOL_WAITING.get(address="pool-test:27017") == 0
+    assert POOL_CHECKED_OUT.get(address="pool-test:27017") == 1
+    assert POOL_CHECKOUT_SECONDS.count(address="pool-test:27017") == 1
+
+    listener.connection_checked_in(monitoring.ConnectionCheckedInEvent(address, 1))
+    listener.connection_closed(monitoring.ConnectionClosedEvent(address, 1, "idle"))
+    assert POOL_CHECKED_OUT.get(address="pool-test:27017") == 0
+    assert POOL_CONNECTIONS.get(address="pool-test:27017") == 0
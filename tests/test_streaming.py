@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+
+from app.schemas.chat import PacingPolicy, StreamMode
+from app.services.streaming import (
+    StreamEncoder, StreamInterrupted, close_on, coalesce_deltas, negotiate_stream_mode, pace_deltas, replay_deltas
+)
+
+async def fake_events(deltas, delay=0.0):
+    yield "user_message", {"message_id": "u1", "message": "Hi"}
+    for delta in deltas:
+        if delay:
+            await asyncio.sleep(delay)
+        yield "assistant_message", {"message_id": "a1", "delta": delta}
+    yield "done", {"message_id": "a1", "status": "completed"}
+
+async def collect(events):
+    return [event async for event in events]
+
+def test_negotiate_stream_mode():
+    assert negotiate_stream_mode(StreamMode.DELTA, None) == StreamMode.DELTA
+    assert negotiate_stream_mode(None, "text/event-stream; mode=delta") == StreamMode.DELTA
+    assert negotiate_stream_mode(None, "application/json, text/event-stream;mode=full") == StreamMode.FULL
+    assert negotiate_stream_mode(None, "text/event-stream; mode=bogus") == StreamMode.FULL
+    assert negotiate_stream_mode(None, None, StreamMode.DELTA) == StreamMode.DELTA
+
+def test_full_mode_carries_buffer():
+    encoder = StreamEncoder(StreamMode.FULL)
+    encoder.encode("assistant_message", {"message_id": "a1", "delta": "Hel"})
+    [(event_type, payload)] = encoder.encode("assistant_message", {"message_id": "a1", "delta": "lo"})
+    assert event_type == "assistant_message"
+    assert payload == {"message_id": "a1", "delta": "lo", "buffer": "Hello"}
+
+def test_delta_mode_checkpoints_and_final_message():
+    encoder = StreamEncoder(StreamMode.DELTA, checkpoint_interval=2)
+    first = encoder.encode("assistant_message", {"message_id": "a1", "delta": "Hel"})
+    second = encoder.encode("assistant_message", {"message_id": "a1", "delta": "lo"})
+    assert first == [("assistant_message", {"message_id": "a1", "delta": "Hel"})]
+    assert second[1] == ("checkpoint", {"message_id": "a1", "offset": 5, "buffer": "Hello"})
+
+    [(event_type, payload)] = encoder.encode("done", {"message_id": "a1", "status": "completed"})
+    assert event_type == "done"
+    assert payload["message"] == "Hello"
+
+async def test_coalesce_by_size():
+    events = await collect(coalesce_deltas(fake_events(["a", "b", "c", "d", "e"]), max_chars=2))
+    deltas = [data["delta"] for event_type, data in events if event_type == "assistant_message"]
+    assert deltas == ["ab", "cd", "e"]
+    assert events[0][0] == "user_message"
+    assert events[-1][0] == "done"
+
+async def test_coalesce_by_window():
+    events = await collect(coalesce_deltas(fake_events(["a", "b", "c"], delay=0.02), window=0.5))
+    deltas = [data["delta"] for event_type, data in events if event_type == "assistant_message"]
+    assert deltas == ["abc"]
+
+async def test_coalesce_disabled_passes_through():
+    events = await collect(coalesce_deltas(fake_events(["a", "b"])))
+    assert len(events) == 4
+
+def deltas_of(events):
+    return [data["delta"] for event_type, data in events if event_type == "assistant_message"]
+
+async def test_adaptive_pacing_batches_backlog():
+    events = await collect(pace_deltas(fake_events(["a", "b", "c"]), PacingPolicy.ADAPTIVE))
+    assert deltas_of(events) == ["abc"]
+
+async def test_adaptive_pacing_does_not_wait_for_more_tokens():
+    events = await collect(pace_deltas(fake_events(["a", "b"], delay=0.05), PacingPolicy.ADAPTIVE))
+    assert deltas_of(events) == ["a", "b"]
+
+async def test_fixed_pacing_limits_frame_rate():
+    events = await collect(
+        pace_deltas(fake_events(list("abcdefghij"), delay=0.01), PacingPolicy.FIXED, frame_rate=10)
+    )
+    deltas = deltas_of(events)
+    assert deltas[0] == "a"
+    assert "".join(deltas) == "abcdefghij"
+    assert len(deltas) < 5
+
+def test_replay_deltas_keep_the_reply_intact():
+    for reply in ["Hello there, friend!", "  leading and trailing  ", "one", ""]:
+        assert "".join(replay_deltas(reply)) == reply
+    assert replay_deltas("Hello there, friend!") == ["Hello", " there,", " friend!"]
+
+
+async def test_close_on_stops_a_waiting_source():
+    closed = asyncio.Event()
+
+    async def source():
+        try:
+            yield "first"
+            await asyncio.sleep(10)
+            yield "never"
+        finally:
+            closed.set()
+
+    stop = asyncio.Event()
+    received = []
+    with pytest.raises(StreamInterrupted):
+        async for item in close_on(source(), stop):
+            received.append(item)
+            asyncio.get_running_loop().call_later(0.01, stop.set)
+    assert received == ["first"]
+    assert closed.is_set()
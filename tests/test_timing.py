@@ -0,0 +1,23 @@
+from app.core import metrics
+from app.core.metrics import Histogram, MetricsRegistry
+from app.core.timing import Timings
+
+def test_timings_without_metrics():
+    timings = Timings(histogram=None)
+    with timings.span("conversation_load"):
+        pass
+    timings.record("llm_first_token", 0.25)
+    timings.record("llm_first_token", 0.05)
+
+    assert list(timings.spans) == ["conversation_load", "llm_first_token"]
+    assert abs(timings.spans["llm_first_token"] - 0.3) < 1e-9
+    assert timings.server_timing().endswith("llm_first_token;dur=300.0")
+
+def test_timings_observe_histogram(monkeypatch):
+    monkeypatch.setattr(metrics, "registry", MetricsRegistry())
+    histogram = Histogram("test_stage_seconds", "Stages", ["stage"])
+    timings = Timings(histogram)
+    timings.record("persist", 0.01)
+    timings.record("persist", 0.02)
+
+    assert histogram.count(stage="persist") == 2
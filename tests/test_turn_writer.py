@@ -0,0 +1,62 @@
+import asyncio
+from app.crud.chat import ChatCRUD
+from app.crud.turn_writer import PendingTurn, TurnWriter, merge_turns
+from app.models.conversation import BotConversation, Message, MessageType
+
+def make_message(message_id: str) -> Message:
+    return Message(message_id=message_id, type=MessageType.USER, message=message_id)
+
+def test_merge_turns_keeps_order_per_chat():
+    conversation = BotConversation(chat_id="a", bot_id="bot", messages=[])
+    merged = merge_turns([
+        PendingTurn("a", [make_message("a1")], conversation, enqueued_at=1.0),
+        PendingTurn("b", [make_message("b1")], enqueued_at=2.0),
+        PendingTurn("a", [make_message("a2")], enqueued_at=3.0),
+    ])
+
+    assert [turn.chat_id for turn in merged] == ["a", "b"]
+    assert [msg.message_id for msg in merged[0].messages] == ["a1", "a2"]
+    assert merged[0].conversation is conversation
+    assert merged[0].enqueued_at == 1.0
+
+async def test_turn_writer_flushes_on_stop(test_db, sample_message_data):
+    writer = TurnWriter()
+    await writer.start(test_db)
+    new_conversation = BotConversation(chat_id="write_behind_chat", bot_id="test_bot_1", messages=[])
+    await writer.submit("write_behind_chat", [make_message("m1"), make_message("m2")], new_conversation)
+    await writer.submit("write_behind_chat", [make_message("m3")])
+    await writer.stop()
+
+    assert writer.pending == 0
+    conversation = await ChatCRUD(test_db).get_conversation("write_behind_chat")
+    assert conversation.bot_id == "test_bot_1"
+    assert [msg.message_id for msg in conversation.messages] == ["m1", "m2", "m3"]
+
+async def test_turn_writer_retries_appends_to_missing_conversations(test_db, monkeypatch):
+    from app.core.config import settings
+    from app.crud.turn_writer import PERSISTENCE_FAILURES
+    monkeypatch.setattr(settings, "WRITE_BEHIND_MAX_ATTEMPTS", 2)
+
+    failures = PERSISTENCE_FAILURES.get()
+    writer = TurnWriter()
+    await writer.start(test_db)
+    await writer.submit("missing_chat", [make_message("m1")])
+    await writer.stop()
+
+    assert PERSISTENCE_FAILURES.get() == failures + 1
+    assert await ChatCRUD(test_db).get_conversation("missing_chat") is None
+
+async def test_turn_writer_stop_waits_for_spawned_tasks(test_db):
+    writer = TurnWriter()
+    await writer.start(test_db)
+    new_conversation = BotConversation(chat_id="spawned_chat", bot_id="test_bot_1", messages=[])
+
+    async def save_later():
+        await asyncio.sleep(0.05)
+        await writer.submit("spawned_chat", [make_message("m1")], new_conversation)
+
+    writer.spawn(save_later())
+    await writer.stop()
+
+    conversation = await ChatCRUD(test_db).get_conversation("spawned_chat")
+    assert [msg.message_id for msg in conversation.messages] == ["m1"]